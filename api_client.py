@@ -1,18 +1,206 @@
+import asyncio
+import time
 import aiohttp
-from typing import List, Dict, Optional
+from dataclasses import asdict
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from cache import TTLCache
+from json_stream import iter_json_array
+from models import Appointment, Doctor, Room
+from slots import earliest_free_slots
+from user_stats import UserStatistics
+
+# Fastest available JSON decoder (all accept bytes)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+        json_loads = msgspec.json.Decoder().decode
+    except ImportError:
+        import json
+        json_loads = json.loads
+
+# Cache lifetimes (seconds)
+USER_ID_TTL = 3600
+APPOINTMENTS_TTL = 60
+DOCTORS_TTL = 300
+
+# Catalog endpoints answered with ETag/Last-Modified (conditional requests).
+# aiohttp asks for gzip/deflate bodies, and br when Brotli is installed
+DOCTORS_PATH = "/api/v1/doctors"
+ROOMS_PATH = "/api/v1/rooms"
+SLOTS_TTL = 30
+
+# Read size for streamed appointment lists
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How long results of idempotent writes are remembered
+IDEMPOTENCY_TTL = 300
+
+# Parallel DELETEs of one bulk cancellation
+BULK_CANCEL_CONCURRENCY = 5
+
+# How often statistics aggregates are checked against backend
+STATISTICS_RECONCILE_INTERVAL = 3600
+
+
+class AuthenticationError(Exception):
+    """Backend rejected access token (401) - user has to log in again"""
 
 class MedicalAPIClient:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", user_statistics: Optional[Dict] = None,
+                 trace_configs: Optional[List[aiohttp.TraceConfig]] = None,
+                 stream_appointments: bool = False):
         self.base_url = base_url
         self.session = None
+        self.trace_configs = trace_configs
+        # Parse /appointments incrementally instead of buffering the whole body
+        self.stream_appointments = stream_appointments
+        
+        # Caches shared by all handlers using this client
+        self.user_ids = TTLCache(USER_ID_TTL)
+        self.appointments = TTLCache(APPOINTMENTS_TTL)
+        self.doctors = TTLCache(DOCTORS_TTL, maxsize=1)
+        # Last known catalog (expired cache or disk snapshot), served while refreshing
+        self.last_catalog: Optional[List[Doctor]] = None
+        self.catalog_fetched_at: Optional[float] = None
+        self.catalog_failed = False
+        self._catalog_refresh: Optional[asyncio.Task] = None
+        # Token the current catalog refresh was started with
+        self._catalog_refresh_token: Optional[str] = None
+        # Last rooms list, revalidated on every booking
+        self.rooms: Optional[List[Room]] = None
+        # ETag/Last-Modified of kept responses by path, for conditional requests
+        self._validators: Dict[str, Dict[str, str]] = {}
+        # get_doctor_info calls of the current loop tick by access token,
+        # one batch per token (a 401 only reaches callers who sent that token)
+        self._doctor_requests: Dict[str, Dict[str, List[asyncio.Future]]] = {}
+        self._doctor_batches = set()
+        # (doctor_id, date) -> set of booked times, built from one request
+        self.booked_slots = TTLCache(SLOTS_TTL, maxsize=1)
+        
+        # Bumped on every write so reads started before it don't overwrite caches
+        self._appointments_version = {}
+        self._slots_version = 0
+        # Bumped whenever cached doctors/user's appointments change (render cache keys)
+        self._data_versions = {}
+        
+        # Idempotent writes: running tasks and recent results by key
+        self._in_flight = {}
+        self._completed = TTLCache(IDEMPOTENCY_TTL)
+        
+        # Statistics aggregates by email (usually owned by the session store)
+        self.user_statistics = user_statistics if user_statistics is not None else {}
+        self._reconciling = {}
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        await self.start()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    async def start(self):
+        """Open HTTP session (reused across requests)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(trace_configs=self.trace_configs)
+    
+    async def close(self):
+        """Close HTTP session"""
+        if self._catalog_refresh is not None and not self._catalog_refresh.done():
+            self._catalog_refresh.cancel()
         if self.session:
             await self.session.close()
+            self.session = None
+    
+    async def _get_user_id(self, user_email: str, access_token: str) -> Optional[str]:
+        """Resolve user id by email (cached)"""
+        user_id = self.user_ids.get(user_email)
+        if user_id is not None:
+            return user_id
+        
+        headers = {"Authorization": f"Bearer {access_token}"}
+        async with self.session.get(
+            f"{self.base_url}/api/v1/users", 
+            headers=headers
+        ) as response:
+            check_auth(response)
+            if response.status != 200:
+                return None
+            
+            users = await read_json(response)
+        
+        # Remember every user from the list, it's the same request anyway
+        for u in users:
+            self.user_ids.set(u['email'], u['id'])
+        
+        user = next((u for u in users if u['email'] == user_email), None)
+        return user['id'] if user else None
+    
+    def data_version(self, key: str) -> int:
+        """Version of cached data: "doctors" for the catalog, user email for appointments"""
+        return self._data_versions.get(key, 0)
+    
+    def _touch(self, key: str) -> None:
+        self._data_versions[key] = self._data_versions.get(key, 0) + 1
+    
+    def caches(self) -> Dict[str, TTLCache]:
+        """Caches by name (for monitoring)"""
+        return {
+            "user_ids": self.user_ids,
+            "appointments": self.appointments,
+            "doctors": self.doctors,
+            "booked_slots": self.booked_slots,
+            "idempotency": self._completed
+        }
+    
+    def is_in_flight(self, idempotency_key: str) -> bool:
+        """Check whether write with this key is still running"""
+        return idempotency_key in self._in_flight
+    
+    async def _run_once(self, idempotency_key: str, factory):
+        """Run write once per key; concurrent and repeated calls share its result"""
+        if idempotency_key in self._completed:
+            return self._completed.get(idempotency_key)
+        
+        task = self._in_flight.get(idempotency_key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._in_flight[idempotency_key] = task
+            
+            def _done(t):
+                self._in_flight.pop(idempotency_key, None)
+                if t.cancelled() or t.exception() is not None:
+                    return
+                result = t.result()
+                # Failed writes may be retried, successful ones are final
+                if result and not (isinstance(result, dict) and result.get('error')):
+                    self._completed.set(idempotency_key, result)
+            
+            task.add_done_callback(_done)
+        
+        # Shield: a cancelled caller must not abort the write for the others
+        return await asyncio.shield(task)
+    
+    async def drain(self, timeout: float) -> bool:
+        """Wait for running writes and statistics rebuilds, False on timeout"""
+        tasks = [*self._in_flight.values(), *self._reconciling.values()]
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return not pending
+    
+    async def warm_up_user(self, user_email: str, access_token: str) -> None:
+        """Prefetch user's working set into caches"""
+        await self.get_user_appointments(user_email, access_token)
+        
+        # Appointments are cached now, so statistics won't fetch them again
+        await asyncio.gather(
+            self.get_doctors_by_specialization(None, access_token),
+            self.get_user_statistics(user_email, access_token)
+        )
     
     async def authenticate_user(self, email: str, password: str) -> Optional[str]:
         """Authenticate user and return access token"""
@@ -27,54 +215,131 @@ class MedicalAPIClient:
                 data=data
             ) as response:
                 if response.status == 200:
-                    result = await response.json()
+                    result = await read_json(response)
                     return result.get("access_token")
                 return None
         except Exception:
             return None
     
-    async def get_user_appointments(self, user_email: str, access_token: str) -> List[Dict]:
+    async def get_user_appointments(self, user_email: str, access_token: str) -> List[Appointment]:
         """Get user's appointment history"""
+        appointments = await self._user_appointments(user_email, access_token)
+        return appointments if appointments is not None else []
+    
+    async def _user_appointments(self, user_email: str, access_token: str) -> Optional[List[Appointment]]:
+        """User's appointments (cached), None if the backend request failed"""
+        cached = self.appointments.get(user_email)
+        if cached is not None:
+            return cached
+        
         headers = {"Authorization": f"Bearer {access_token}"}
+        version = self._appointments_version.get(user_email, 0)
         
         try:
             # First get user by email to get user_id
-            async with self.session.get(
-                f"{self.base_url}/api/v1/users", 
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    return []
-                
-                users = await response.json()
-                user = next((u for u in users if u['email'] == user_email), None)
-                if not user:
-                    return []
-                
-                user_id = user['id']
+            user_id = await self._get_user_id(user_email, access_token)
+            if not user_id:
+                return None
             
             # Get appointments for this user
             async with self.session.get(
                 f"{self.base_url}/api/v1/appointments",
                 headers=headers
             ) as response:
+                check_auth(response)
                 if response.status != 200:
-                    return []
+                    return None
                 
-                appointments = await response.json()
-                # Filter appointments for this user
-                user_appointments = [
-                    apt for apt in appointments 
-                    if apt.get('user_id') == user_id
-                ]
+                if self.stream_appointments:
+                    # Parse while downloading, keep only this user's appointments
+                    user_appointments = [
+                        apt async for apt in iter_json_array(
+                            response.content.iter_chunked(STREAM_CHUNK_SIZE),
+                            lambda apt: apt.get('user_id') == user_id
+                        )
+                    ]
+                else:
+                    appointments = await read_json(response)
+                    # Filter appointments for this user
+                    user_appointments = filter_user_appointments(appointments, user_id)
+                user_appointments = [Appointment.from_dict(apt) for apt in user_appointments]
                 
+                # Don't cache list if booking/cancellation happened meanwhile
+                if self._appointments_version.get(user_email, 0) == version:
+                    self.appointments.set(user_email, user_appointments)
+                    self._touch(user_email)
                 return user_appointments
                 
+        except AuthenticationError:
+            raise
         except Exception:
-            return []
+            return None
+    
+    async def get_doctor(self, doctor_id: str, access_token: str) -> Optional[Doctor]:
+        """Doctor from cached catalog, single-doctor request if it's not there"""
+        doctors = await self.get_doctors_by_specialization(None, access_token)
+        doctor = next((d for d in doctors if d.id == doctor_id), None)
+        if doctor is None:
+            doctor = await self.get_doctor_info(doctor_id, access_token)
+        return doctor
+    
+    async def get_doctor_info(self, doctor_id: str, access_token: str) -> Optional[Doctor]:
+        """Get doctor information by ID
+        
+        Calls made during one event loop tick with the same token are
+        collected and answered together from the catalog (at most one list
+        request).
+        """
+        loop = asyncio.get_running_loop()
+        requests = self._doctor_requests.get(access_token)
+        if requests is None:
+            requests = self._doctor_requests[access_token] = {}
+            loop.call_soon(self._dispatch_doctor_batch, access_token)
+        
+        future = loop.create_future()
+        requests.setdefault(doctor_id, []).append(future)
+        return await future
+    
+    def _dispatch_doctor_batch(self, access_token: str) -> None:
+        requests = self._doctor_requests.pop(access_token)
+        task = asyncio.create_task(self._load_doctor_batch(requests, access_token))
+        self._doctor_batches.add(task)
+        task.add_done_callback(self._doctor_batches.discard)
+    
+    async def _load_doctor_batch(self, requests: Dict[str, List[asyncio.Future]], access_token: str) -> None:
+        """Resolve collected get_doctor_info calls and wake their callers"""
+        futures = [future for waiting in requests.values() for future in waiting]
+        try:
+            doctors = await self._resolve_doctors(list(requests), access_token)
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for doctor_id, waiting in requests.items():
+            for future in waiting:
+                if not future.done():
+                    future.set_result(doctors.get(doctor_id))
+    
+    async def _resolve_doctors(self, doctor_ids: List[str], access_token: str) -> Dict[str, Doctor]:
+        """Doctors by id from catalog; ones missing there (e.g. removed) requested one by one"""
+        wanted = set(doctor_ids)
+        catalog = await self.get_doctors_by_specialization(None, access_token)
+        found = {doctor.id: doctor for doctor in catalog if doctor.id in wanted}
+        
+        missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in found]
+        if missing:
+            results = await asyncio.gather(*(self._fetch_doctor(doctor_id, access_token) for doctor_id in missing))
+            found.update((doctor.id, doctor) for doctor in results if doctor)
+        return found
     
-    async def get_doctor_info(self, doctor_id: str, access_token: str) -> Optional[Dict]:
-        """Get doctor information by ID"""
+    async def _fetch_doctor(self, doctor_id: str, access_token: str) -> Optional[Doctor]:
+        """Single doctor request"""
         headers = {"Authorization": f"Bearer {access_token}"}
         
         try:
@@ -82,72 +347,239 @@ class MedicalAPIClient:
                 f"{self.base_url}/api/v1/doctors/{doctor_id}",
                 headers=headers
             ) as response:
+                check_auth(response)
                 if response.status == 200:
-                    return await response.json()
+                    return Doctor.from_dict(await read_json(response))
                 return None
+        except AuthenticationError:
+            raise
         except Exception:
             return None
-    async def get_doctors_by_specialization(self, specialization: str, access_token: str = None) -> List[Dict]:
-        """Get doctors by specialization"""
-        headers = {}
-        if access_token:
-            headers["Authorization"] = f"Bearer {access_token}"
+    
+    async def get_booked_slots(self, doctor_id: str, date: str, access_token: str) -> set:
+        """Get booked times ('HH:MM') of doctor for date"""
+        index = await self.booked_index(access_token)
+        if index is None:
+            return set()
+        return set(index.get((doctor_id, date), ()))
+    
+    async def get_earliest_slots(self, specialization: str, times: List[str], access_token: str,
+                                 limit: int = 5) -> List[Tuple[datetime, Doctor]]:
+        """Earliest free (datetime, doctor) slots among doctors of specialization"""
+        doctors = await self.get_doctors_by_specialization(specialization, access_token)
+        if not doctors:
+            return []
+        index = await self.booked_index(access_token)
+        if index is None:
+            return []
+        return earliest_free_slots(doctors, index, times, limit)
+    
+    async def booked_index(self, access_token: str) -> Optional[Dict]:
+        """Booked times of all doctors by (doctor_id, 'YYYY-MM-DD'), None on error"""
+        index = self.booked_slots.get("all")
+        if index is not None:
+            return index
+        
+        headers = {"Authorization": f"Bearer {access_token}"}
+        version = self._slots_version
         
         try:
             async with self.session.get(
-                f"{self.base_url}/api/v1/doctors",
+                f"{self.base_url}/api/v1/appointments",
                 headers=headers
             ) as response:
+                check_auth(response)
                 if response.status != 200:
-                    return []
-                
-                doctors = await response.json()
-                
-                # Filter by specialization if specified
-                if specialization and specialization != "all":
-                    filtered_doctors = [
-                        doctor for doctor in doctors 
-                        if doctor.get('specialization', '').lower() == specialization.lower()
-                    ]
-                    return filtered_doctors
+                    return None
                 
-                return doctors
+                if self.stream_appointments:
+                    appointments = iter_json_array(response.content.iter_chunked(STREAM_CHUNK_SIZE))
+                else:
+                    appointments = _aiter(await read_json(response))
                 
+                index = {}
+                async for apt in appointments:
+                    key = _slot_key(apt)
+                    if key:
+                        index.setdefault(key[:2], set()).add(key[2])
+        except AuthenticationError:
+            raise
         except Exception:
-            return []
-    async def create_appointment(self, doctor_id: str, date: str, time: str, user_email: str, access_token: str) -> Optional[Dict]:
-        """Create new appointment"""
-        headers = {"Authorization": f"Bearer {access_token}"}
+            return None
+        
+        if self._slots_version == version:
+            self.booked_slots.set("all", index)
+        return index
+    
+    async def get_doctors_by_specialization(self, specialization: str, access_token: str = None) -> List[Doctor]:
+        """Get doctors by specialization
+        
+        Once the catalog is known, an expired cache doesn't block: the last
+        known catalog is returned at once and refreshed in background.
+        Before that, callers wait for one shared catalog request.
+        """
+        doctors = self.doctors.get("all")
+        
+        if doctors is None and self.last_catalog is not None:
+            self.refresh_catalog(access_token)
+            doctors = self.last_catalog
+        
+        if doctors is None:
+            # Concurrent first loads share one request; a caller giving up
+            # (timeout) doesn't cancel it for the others
+            task = self.refresh_catalog(access_token)
+            while True:
+                try:
+                    doctors = await asyncio.shield(task)
+                    break
+                except AuthenticationError:
+                    if task is self._catalog_refresh and self._catalog_refresh_token == access_token:
+                        raise  # Our own token was rejected
+                    # Token of whoever started the shared request - retry with
+                    # ours, still one request for all callers retrying
+                    task = self.refresh_catalog(access_token)
+            if doctors is None:
+                return []
+        
+        return filter_doctors(doctors, specialization)
+    
+    def refresh_catalog(self, access_token: Optional[str] = None) -> asyncio.Task:
+        """Fetch doctors catalog in background (one request at a time)
+        
+        The token of the caller starting the refresh is used; an expired
+        one just leaves the catalog for the next refresh.
+        """
+        if self._catalog_refresh is None or self._catalog_refresh.done():
+            task = asyncio.create_task(self._fetch_doctors(access_token))
+            task.add_done_callback(_consume_exception)
+            self._catalog_refresh = task
+            self._catalog_refresh_token = access_token
+        return self._catalog_refresh
+    
+    def catalog_stale_since(self) -> Optional[float]:
+        """Fetch time of served catalog if it's outdated (backend unavailable), else None"""
+        if self.last_catalog is None or self.catalog_fetched_at is None:
+            return None
+        if self.catalog_failed or time.time() - self.catalog_fetched_at > 2 * DOCTORS_TTL:
+            return self.catalog_fetched_at
+        return None
+    
+    def catalog_snapshot(self) -> Optional[Dict]:
+        """Last known catalog as plain data for the disk snapshot"""
+        if self.last_catalog is None:
+            return None
+        return {
+            "fetched_at": self.catalog_fetched_at,
+            "validators": self._validators.get(DOCTORS_PATH, {}),
+            "doctors": [asdict(doctor) for doctor in self.last_catalog]
+        }
+    
+    def restore_catalog(self, snapshot: Dict) -> int:
+        """Serve catalog from snapshot until the backend answers"""
+        self.last_catalog = [Doctor.from_dict(doctor) for doctor in snapshot["doctors"]]
+        self.catalog_fetched_at = snapshot["fetched_at"]
+        # First refresh after start is answered with 304 if nothing changed
+        self._validators[DOCTORS_PATH] = snapshot.get("validators", {})
+        self._touch("doctors")
+        return len(self.last_catalog)
+    
+    async def _fetch_doctors(self, access_token: Optional[str]) -> Optional[List[Doctor]]:
+        """Request doctors catalog, None if backend failed
+        
+        Revalidates the last known catalog: 304 renews the cache without
+        downloading or decoding the list again.
+        """
+        headers = {}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        if self.last_catalog is not None:
+            headers.update(self._validators.get(DOCTORS_PATH, {}))
         
         try:
-            # Get user info by email
             async with self.session.get(
-                f"{self.base_url}/api/v1/users", 
+                f"{self.base_url}{DOCTORS_PATH}",
                 headers=headers
             ) as response:
-                if response.status != 200:
+                if access_token:
+                    # Anonymous catalog view just gets an empty list
+                    check_auth(response)
+                if response.status == 304 and self.last_catalog is not None:
+                    doctors = self.last_catalog
+                elif response.status == 200:
+                    doctors = [Doctor.from_dict(doctor) for doctor in await read_json(response)]
+                    self._remember_validators(DOCTORS_PATH, response)
+                elif response.status in (401, 403):
+                    # Catalog needs login - not a backend outage
                     return None
-                
-                users = await response.json()
-                user = next((u for u in users if u['email'] == user_email), None)
-                if not user:
+                else:
+                    self.catalog_failed = True
                     return None
-                
-                user_id = user['id']
+        except AuthenticationError:
+            raise
+        except Exception:
+            self.catalog_failed = True
+            return None
+        
+        self.doctors.set("all", doctors)
+        self.catalog_fetched_at = time.time()
+        self.catalog_failed = False
+        if doctors is not self.last_catalog:
+            self.last_catalog = doctors
+            self._touch("doctors")
+        return doctors
+    
+    def _remember_validators(self, path: str, response: aiohttp.ClientResponse) -> None:
+        """Keep ETag/Last-Modified to send as If-None-Match/If-Modified-Since"""
+        validators = {}
+        if response.headers.get("ETag"):
+            validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        self._validators[path] = validators
+    
+    async def create_appointment(self, doctor_id: str, date: str, time: str, user_email: str, access_token: str,
+                                 idempotency_key: Optional[str] = None) -> Optional[Dict]:
+        """Create new appointment"""
+        if idempotency_key:
+            return await self._run_once(
+                idempotency_key,
+                lambda: self._create_appointment(doctor_id, date, time, user_email, access_token, idempotency_key)
+            )
+        return await self._create_appointment(doctor_id, date, time, user_email, access_token)
+    
+    async def _create_appointment(self, doctor_id: str, date: str, time: str, user_email: str, access_token: str,
+                                  idempotency_key: Optional[str] = None) -> Optional[Dict]:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        
+        try:
+            # Get user info by email
+            user_id = await self._get_user_id(user_email, access_token)
+            if not user_id:
+                return None
             
             # Get available room (first room for simplicity)
+            rooms_headers = dict(headers)
+            if self.rooms is not None:
+                rooms_headers.update(self._validators.get(ROOMS_PATH, {}))
+            
             async with self.session.get(
-                f"{self.base_url}/api/v1/rooms",
-                headers=headers
+                f"{self.base_url}{ROOMS_PATH}",
+                headers=rooms_headers
             ) as response:
-                if response.status != 200:
+                check_auth(response)
+                if response.status == 304 and self.rooms is not None:
+                    rooms = self.rooms
+                elif response.status == 200:
+                    rooms = [Room.from_dict(room) for room in await read_json(response)]
+                    self.rooms = rooms
+                    self._remember_validators(ROOMS_PATH, response)
+                else:
                     return None
                 
-                rooms = await response.json()
                 if not rooms:
                     return {"error": "no_rooms", "message": "Нет доступных комнат для записи"}
                 
-                room_id = rooms[0]['id']
+                room_id = rooms[0].id
             
             # Create appointment with correct format
             appointment_data = {
@@ -157,25 +589,122 @@ class MedicalAPIClient:
                 "datetime": f"{date}T{time}:00"  # Combine date and time
             }
             
+            post_headers = dict(headers)
+            if idempotency_key:
+                # Lets backend drop retried duplicates too
+                post_headers["Idempotency-Key"] = idempotency_key
+            
             async with self.session.post(
                 f"{self.base_url}/api/v1/appointments",
-                headers=headers,
+                headers=post_headers,
                 json=appointment_data
             ) as response:
+                check_auth(response)
                 if response.status in [200, 201]:
-                    appointment_result = await response.json()
+                    appointment_result = await read_json(response)
                     # Add room number to result
-                    room_number = next((r['number'] for r in rooms if r['id'] == room_id), 'Неизвестно')
+                    room_number = next((r.number for r in rooms if r.id == room_id), 'Неизвестно')
                     appointment_result['room_number'] = room_number
+                    
+                    summary = await self._doctor_summary(
+                        doctor_id,
+                        {doctor.id: doctor for doctor in self.last_catalog or []},
+                        access_token
+                    )
+                    self._apply_created(user_email, appointment_result, summary)
                     return appointment_result
                 else:
                     return None
                 
+        except AuthenticationError:
+            raise
         except Exception:
             return None
     
-    async def cancel_appointment(self, appointment_id: str, access_token: str) -> bool:
+    def _apply_created(self, user_email: str, appointment: Dict, doctor_summary) -> None:
+        """Write new appointment through all caches (no awaits - atomic for the event loop)"""
+        self._appointments_version[user_email] = self._appointments_version.get(user_email, 0) + 1
+        self._slots_version += 1
+        record = Appointment.from_dict(appointment)
+        
+        user_appointments = self.appointments.get(user_email)
+        if user_appointments is not None:
+            self.appointments.set(user_email, user_appointments + [record])
+            self._touch(user_email)
+        
+        index = self.booked_slots.get("all")
+        if index is not None and record.doctor_id and record.starts_at:
+            index.setdefault((record.doctor_id, record.date), set()).add(record.time)
+        
+        stats = self.user_statistics.get(user_email)
+        if stats is not None:
+            stats.add(record.id, *doctor_summary, record.month)
+    
+    def _apply_cancelled(self, user_email: Optional[str], appointment_id: str) -> None:
+        """Remove cancelled appointment from all caches (atomic for the event loop)"""
+        self._slots_version += 1
+        appointment = None
+        
+        if user_email:
+            self._appointments_version[user_email] = self._appointments_version.get(user_email, 0) + 1
+            
+            user_appointments = self.appointments.get(user_email)
+            if user_appointments is not None:
+                appointment = next(
+                    (apt for apt in user_appointments if str(apt.id) == str(appointment_id)),
+                    None
+                )
+                self.appointments.set(user_email, [
+                    apt for apt in user_appointments if apt is not appointment
+                ])
+                self._touch(user_email)
+            
+            if user_email in self.user_statistics:
+                self.user_statistics[user_email].remove(appointment_id)
+        
+        index = self.booked_slots.get("all")
+        if index is not None and appointment and appointment.starts_at:
+            index.get((appointment.doctor_id, appointment.date), set()).discard(appointment.time)
+        elif index is not None:
+            # Don't know which slot got freed - rebuild index on next request
+            self.booked_slots.pop("all")
+    
+    async def cancel_appointment(self, appointment_id: str, access_token: str, user_email: Optional[str] = None) -> bool:
         """Cancel appointment by ID"""
+        # Repeated cancellations of the same appointment collapse into one DELETE
+        return await self._run_once(
+            cancel_key(appointment_id),
+            lambda: self._cancel_appointment(appointment_id, access_token, user_email)
+        )
+    
+    async def cancel_appointments(self, appointment_ids: List[str], access_token: str,
+                                  user_email: Optional[str] = None,
+                                  concurrency: int = BULK_CANCEL_CONCURRENCY) -> Dict[str, bool]:
+        """Cancel several appointments concurrently, return outcome by ID"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def cancel(appointment_id):
+            async with semaphore:
+                return await self.cancel_appointment(appointment_id, access_token, user_email)
+        
+        outcomes = await asyncio.gather(
+            *(cancel(appointment_id) for appointment_id in appointment_ids),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, AuthenticationError):
+                raise outcome
+        
+        if user_email and not all(outcome is True for outcome in outcomes):
+            # State of failed ones is unknown - reload list once, not per item
+            self.appointments.pop(user_email)
+        
+        return {
+            appointment_id: outcome is True
+            for appointment_id, outcome in zip(appointment_ids, outcomes)
+        }
+    
+    async def _cancel_appointment(self, appointment_id: str, access_token: str, user_email: Optional[str] = None) -> bool:
         headers = {"Authorization": f"Bearer {access_token}"}
         
         try:
@@ -183,67 +712,187 @@ class MedicalAPIClient:
                 f"{self.base_url}/api/v1/appointments/{appointment_id}",
                 headers=headers
             ) as response:
-                return response.status in [200, 204]
+                check_auth(response)
+                success = response.status in [200, 204]
+        except AuthenticationError:
+            raise
         except Exception:
             return False
+        
+        if success:
+            self._apply_cancelled(user_email, appointment_id)
+        
+        return success
     
     async def get_user_statistics(self, user_email: str, access_token: str) -> Optional[Dict]:
         """Get user statistics"""
-        headers = {"Authorization": f"Bearer {access_token}"}
+        stats = self.user_statistics.get(user_email)
+        
+        if stats is None:
+            stats = await self.reconcile_statistics(user_email, access_token)
+            if stats is None:
+                return None
+        elif stats.is_stale(STATISTICS_RECONCILE_INTERVAL) and user_email not in self._reconciling:
+            # Serve current aggregate, refresh it from backend in background
+            task = asyncio.create_task(
+                self.reconcile_statistics(user_email, access_token, refresh=True)
+            )
+            self._reconciling[user_email] = task
+            task.add_done_callback(lambda t: self._reconciled(user_email, t))
+        
+        return stats.to_dict()
+    
+    def _reconciled(self, user_email: str, task: asyncio.Task) -> None:
+        self._reconciling.pop(user_email, None)
+        if not task.cancelled():
+            task.exception()  # Expired token shows up on the user's next request
+    
+    async def reconcile_statistics(self, user_email: str, access_token: str, refresh: bool = False) -> Optional[UserStatistics]:
+        """Rebuild user's statistics aggregate from full appointment history"""
+        version = self._appointments_version.get(user_email, 0)
         
         try:
-            # Get user appointments
-            appointments = await self.get_user_appointments(user_email, access_token)
-            
-            if not appointments:
-                return {
-                    "total_appointments": 0,
-                    "favorite_doctors": [],
-                    "specializations": {},
-                    "monthly_visits": {}
-                }
-            
-            # Calculate statistics
-            from collections import Counter
-            from datetime import datetime
-            
-            doctor_visits = Counter()
-            specialization_visits = Counter()
-            monthly_visits = Counter()
-            
-            # Get doctor info for each appointment
+            if refresh:
+                # Drop cached list so the aggregate is built from fresh data
+                self.appointments.pop(user_email)
+            appointments = await self._user_appointments(user_email, access_token)
+            if appointments is None:
+                # Backend unavailable - keep current aggregate, retry later
+                return None
+            
+            # One catalog request instead of a doctor lookup per visit
+            # (an empty history is a valid result too: the aggregate drops to zero)
+            doctors = await self.get_doctors_by_specialization(None, access_token) if appointments else []
+            doctors_by_id = {doctor.id: doctor for doctor in doctors}
+            
+            # Doctors gone from the catalog - looked up concurrently, batched into one pass
+            missing = list({
+                appointment.doctor_id for appointment in appointments
+                if appointment.doctor_id and appointment.doctor_id not in doctors_by_id
+            })
+            if missing:
+                found = await asyncio.gather(*(self.get_doctor_info(doctor_id, access_token) for doctor_id in missing))
+                doctors_by_id.update((doctor_id, doctor) for doctor_id, doctor in zip(missing, found) if doctor)
+            
+            stats = UserStatistics()
             for appointment in appointments:
-                doctor_id = appointment.get('doctor_id')
-                if doctor_id:
-                    doctor_info = await self.get_doctor_info(doctor_id, access_token)
-                    if doctor_info:
-                        doctor_name = f"{doctor_info['name']} {doctor_info['surname']}"
-                        doctor_visits[doctor_name] += 1
-                        specialization_visits[doctor_info['specialization']] += 1
-                
-                # Count monthly visits
-                appointment_date = appointment.get('datetime', '')
-                if appointment_date:
-                    try:
-                        date_obj = datetime.fromisoformat(appointment_date.replace('Z', '+00:00'))
-                        month_key = date_obj.strftime('%Y-%m')
-                        monthly_visits[month_key] += 1
-                    except:
-                        pass
-            
-            # Get top 3 favorite doctors
-            favorite_doctors = [
-                {"name": doctor, "visits": count}
-                for doctor, count in doctor_visits.most_common(3)
-            ]
-            
-            return {
-                "total_appointments": len(appointments),
-                "favorite_doctors": favorite_doctors,
-                "specializations": dict(specialization_visits.most_common()),
-                "monthly_visits": dict(monthly_visits)
-            }
+                doctor = doctors_by_id.get(appointment.doctor_id)
+                if doctor:
+                    stats.add(appointment.id, doctor.full_name, doctor.specialization, appointment.month)
+                else:
+                    stats.add(appointment.id, None, None, appointment.month)
+            
+            stats.reconciled_at = time.time()
+            # Booking/cancellation during rebuild: keep incrementally updated aggregate
+            if self._appointments_version.get(user_email, 0) == version:
+                self.user_statistics[user_email] = stats
+            return stats
             
+        except AuthenticationError:
+            raise
         except Exception as e:
             print(f"Statistics error: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    async def _doctor_summary(self, doctor_id: Optional[str], doctors_by_id: Dict, access_token: str):
+        """Return (doctor name, specialization) for statistics"""
+        if not doctor_id:
+            return None, None
+        
+        doctor_info = doctors_by_id.get(doctor_id)
+        if doctor_info is None:
+            doctor_info = await self.get_doctor_info(doctor_id, access_token)
+        if not doctor_info:
+            return None, None
+        
+        return doctor_info.full_name, doctor_info.specialization
+
+
+async def read_json(response: aiohttp.ClientResponse):
+    """Decode response body with the fastest available decoder"""
+    return json_loads(await response.read())
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    """Retrieve exception of background task nobody awaits (no 'never retrieved' warning)"""
+    if not task.cancelled():
+        task.exception()
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def filter_user_appointments(appointments: List[Dict], user_id: str) -> List[Dict]:
+    """Appointments belonging to user"""
+    return [apt for apt in appointments if apt.get('user_id') == user_id]
+
+
+def filter_doctors(doctors: List[Doctor], specialization: Optional[str]) -> List[Doctor]:
+    """Doctors of specialization (all doctors for None/'all')"""
+    if not specialization or specialization == "all":
+        return doctors
+    
+    specialization = specialization.lower()
+    return [
+        doctor for doctor in doctors 
+        if doctor.specialization.lower() == specialization
+    ]
+
+
+def rank_doctors(doctors: List[Doctor], query: str) -> List[Doctor]:
+    """Doctors matching every word of query, best matches first
+
+    A word found at the start of the surname ranks above name, then
+    specialization, then anywhere inside them. Empty query keeps
+    catalog order.
+    """
+    words = query.lower().split()
+    if not words:
+        return list(doctors)
+    
+    ranked = []
+    for position, doctor in enumerate(doctors):
+        fields = (doctor.surname.lower(), doctor.name.lower(), doctor.specialization.lower())
+        score = 0
+        for word in words:
+            word_score = _match_score(word, fields)
+            if word_score is None:
+                break
+            score += word_score
+        else:
+            # Position keeps catalog order on ties and avoids comparing records
+            ranked.append((score, position, doctor))
+    
+    ranked.sort()
+    return [doctor for _, _, doctor in ranked]
+
+
+def _match_score(word: str, fields) -> Optional[int]:
+    for rank, field in enumerate(fields):
+        if field.startswith(word):
+            return rank
+    if any(word in field for field in fields):
+        return len(fields)
+    return None
+
+
+def check_auth(response: aiohttp.ClientResponse) -> None:
+    """Raise AuthenticationError on 401 instead of treating it as empty result"""
+    if response.status == 401:
+        raise AuthenticationError(f"{response.method} {response.url.path}: 401")
+
+
+def cancel_key(appointment_id: str) -> str:
+    """Idempotency key of appointment cancellation"""
+    return f"cancel:{appointment_id}"
+
+
+def _slot_key(appointment: Dict):
+    """Return (doctor_id, 'YYYY-MM-DD', 'HH:MM') of raw API appointment"""
+    appointment_datetime = appointment.get('datetime') or ''
+    doctor_id = appointment.get('doctor_id')
+    if not doctor_id or len(appointment_datetime) < 16:
+        return None
+    return doctor_id, appointment_datetime[:10], appointment_datetime[11:16]
@@ -0,0 +1 @@
+"""Micro-benchmarks of keyboards, message formatting and API client parsing"""
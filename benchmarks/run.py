@@ -0,0 +1,175 @@
+"""Micro-benchmarks for hot paths
+
+    python -m benchmarks.run                 # run and compare with baseline
+    python -m benchmarks.run --save          # store results as new baseline
+    python -m benchmarks.run -k keyboards    # only benchmarks matching substring
+
+Payloads are generated by the load-test fake backend: 1k doctors and
+100k appointments. Exit code is 1 when a benchmark got slower than the
+baseline by more than --threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import date
+
+from api_client import filter_doctors, filter_user_appointments, json_loads, rank_doctors
+from json_stream import JSONArrayParser
+from keyboards import BOOKING_TIMES, BotKeyboards
+from loadtest.fake_backend import FakeMedicalAPI
+from messages import BotMessages, render_cached
+from models import Appointment, Doctor
+from slots import earliest_free_slots
+from user_stats import UserStatistics
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def build_benchmarks():
+    backend = FakeMedicalAPI(users=5000, doctors=1000, rooms=20, history=20)
+    appointments = backend.appointments
+    user_id = backend.users[0]["id"]
+
+    doctors_body = json.dumps(backend.doctors).encode()
+    appointments_body = json.dumps(appointments).encode()
+
+    # Handlers get records from MedicalAPIClient
+    doctors = [Doctor.from_dict(d) for d in backend.doctors]
+    user_appointments = [Appointment.from_dict(a) for a in filter_user_appointments(appointments, user_id)]
+
+    stats = UserStatistics()
+    for i, appointment in enumerate(appointments[:2000]):
+        record = Appointment.from_dict(appointment)
+        stats.add(record.id, f"Врач{i % 50}", f"Спец{i % 6}", record.month)
+    stats_dict = stats.to_dict()
+
+    # Booked index as MedicalAPIClient builds it: (doctor_id, date) -> {'HH:MM'}
+    booked = {}
+    for appointment in appointments:
+        starts_at = appointment["datetime"]
+        booked.setdefault((appointment["doctor_id"], starts_at[:10]), set()).add(starts_at[11:16])
+    earliest = earliest_free_slots(doctors, booked, BOOKING_TIMES)
+
+    today = date.today()
+
+    return {
+        # Keyboards
+        "keyboards.main_menu": BotKeyboards.main_menu,
+        "keyboards.doctors_menu": BotKeyboards.doctors_menu,
+        "keyboards.appointments_menu": BotKeyboards.appointments_menu,
+        "keyboards.back_to_main": BotKeyboards.back_to_main,
+        "keyboards.time_slots": BotKeyboards.time_slots,
+        "keyboards.search_specializations": BotKeyboards.search_specializations,
+        "keyboards.doctors_for_booking[1k]": lambda: BotKeyboards.doctors_for_booking(doctors),
+        "keyboards.booking_time_slots": lambda: BotKeyboards.booking_time_slots({"10:00", "15:00"}),
+        "keyboards.booking_confirmation": lambda: BotKeyboards.booking_confirmation("Врач", "Терапия", "2030-01-01", "10:00"),
+        "keyboards.appointments_for_cancellation": lambda: BotKeyboards.appointments_for_cancellation(user_appointments),
+        "keyboards.calendar": lambda: BotKeyboards.calendar(today.year, today.month),
+        "keyboards.faq_menu": BotKeyboards.faq_menu,
+        "keyboards.earliest_slots": lambda: BotKeyboards.earliest_slots(earliest),
+        # Message formatting
+        "messages.statistics": lambda: BotMessages.statistics(stats_dict),
+        "messages.doctors_list[1k]": lambda: BotMessages.doctors_list(doctors, "Все врачи"),
+        "messages.doctors_list_experience[1k]": lambda: BotMessages.doctors_list(doctors, "Врачи", show_experience=True),
+        "messages.appointments_list": lambda: BotMessages.appointments_list(user_appointments),
+        "messages.doctors_list_cached[1k]": lambda: render_cached(
+            ("doctors", 1, 0, "all", False), lambda: BotMessages.doctors_list(doctors, "Все врачи")
+        ),
+        # Earliest free slot search
+        "slots.earliest_free[1k]": lambda: earliest_free_slots(doctors, booked, BOOKING_TIMES),
+        "slots.earliest_free_specialization": lambda: earliest_free_slots(
+            filter_doctors(doctors, "Терапия"), booked, BOOKING_TIMES
+        ),
+        # Statistics aggregate
+        "user_stats.to_dict[2k]": stats.to_dict,
+        # API client decoding + filtering
+        "api.decode_doctors_stdlib[1k]": lambda: json.loads(doctors_body),
+        "api.decode_doctors[1k]": lambda: json_loads(doctors_body),
+        "api.decode_doctors_records[1k]": lambda: [Doctor.from_dict(d) for d in json_loads(doctors_body)],
+        "api.filter_doctors[1k]": lambda: filter_doctors(doctors, "Терапия"),
+        "api.decode_filter_doctors[1k]": lambda: filter_doctors(
+            [Doctor.from_dict(d) for d in json_loads(doctors_body)], "Терапия"
+        ),
+        "api.rank_doctors[1k]": lambda: rank_doctors(doctors, "тер ив"),
+        "api.decode_appointments_stdlib[100k]": lambda: json.loads(appointments_body),
+        "api.decode_appointments[100k]": lambda: json_loads(appointments_body),
+        "api.filter_appointments[100k]": lambda: filter_user_appointments(appointments, user_id),
+        "api.decode_filter_appointments[100k]": lambda: filter_user_appointments(json_loads(appointments_body), user_id),
+        "api.stream_filter_appointments[100k]": lambda: stream_filter(appointments_body, user_id),
+        "api.decode_filter_records[100k]": lambda: [
+            Appointment.from_dict(a) for a in filter_user_appointments(json_loads(appointments_body), user_id)
+        ],
+    }
+
+
+def stream_filter(body: bytes, user_id: str, chunk_size: int = 64 * 1024):
+    """Same as MedicalAPIClient streaming mode, without network"""
+    parser = JSONArrayParser(lambda apt: apt.get('user_id') == user_id)
+    items = []
+    for i in range(0, len(body), chunk_size):
+        items.extend(parser.feed(body[i:i + chunk_size]))
+    items.extend(parser.close())
+    return items
+
+
+def measure(func, repeat: int) -> float:
+    """Best time of one call in seconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f} µs"
+    return f"{seconds * 1e3:9.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of bot hot paths")
+    parser.add_argument("-k", dest="pattern", default="", help="run benchmarks containing substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="store results as baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':<45} {'time':>12} {'baseline':>12} {'change':>8}")
+    for name, func in build_benchmarks().items():
+        if args.pattern not in name:
+            continue
+
+        results[name] = elapsed = measure(func, args.repeat)
+        line = f"{name:<45} {format_time(elapsed):>12}"
+
+        if name in baseline:
+            change = elapsed / baseline[name] - 1
+            line += f" {format_time(baseline[name]):>12} {change:>+7.0%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if regressions and not args.save:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,134 @@
+import time
+STARTED_AT = time.perf_counter()  # Отсчет времени запуска - до тяжелых импортов (aiogram)
+
 import os
+import uuid
 import asyncio
+from collections import Counter
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart, Command
-from aiogram.types import BotCommand
+from aiogram.filters import CommandStart, Command, ExceptionTypeFilter
+from aiogram.types import BotCommand, InlineQueryResultArticle, InputTextMessageContent
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from api_client import MedicalAPIClient
-from keyboards import BotKeyboards
+from api_client import DOCTORS_TTL, AuthenticationError, MedicalAPIClient, cancel_key, rank_doctors
+from keyboards import BOOKING_TIMES, BotKeyboards
+from messages import BotMessages, render_cached, rendered
+from sessions import SessionStore
+from middlewares import InFlightMiddleware, ThrottlingMiddleware
+import metrics
+import tracing
+from profiling import HandlerProfiler, ProfilingMiddleware
+from broadcast import Broadcaster
+from waitlist import Waitlist
+from snapshot import load_snapshot, save_snapshot
+from startup import StartupTimer, commands_hash
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
-bot = Bot(token=BOT_TOKEN)
+# Фоновая загрузка данных пользователя после входа
+PREFETCH_ON_LOGIN = os.getenv('PREFETCH_ON_LOGIN', '1') == '1'
+
+# Файл хранения сессий и статистики пользователей
+SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', 'sessions.json')
+SESSION_SAVE_INTERVAL = int(os.getenv('SESSION_SAVE_INTERVAL', '60'))
+
+# Проверка срока действия токенов: как часто и за сколько секунд предупреждать
+SESSION_CHECK_INTERVAL = int(os.getenv('SESSION_CHECK_INTERVAL', '60'))
+SESSION_EXPIRY_WARNING = int(os.getenv('SESSION_EXPIRY_WARNING', '300'))
+
+# Ограничение частоты запросов
+THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '2'))
+THROTTLE_BURST = int(os.getenv('THROTTLE_BURST', '10'))
+HEAVY_CONCURRENCY = int(os.getenv('HEAVY_CONCURRENCY', '20'))
+
+# Разбирать список всех записей потоково (память не зависит от размера клиники)
+API_STREAM_APPOINTMENTS = os.getenv('API_STREAM_APPOINTMENTS', '0') == '1'
+
+# Порт для /metrics (0 - не запускать)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Администраторы бота (Telegram ID через запятую)
+ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+
+# Рассылка объявлений: файл прогресса (для продолжения после перезапуска) и скорость
+BROADCAST_STATE_PATH = os.getenv('BROADCAST_STATE_PATH', 'broadcast.json')
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))
+
+# Как часто проверять, не освободилось ли время, которого ждут пользователи
+WAITLIST_POLL_INTERVAL = int(os.getenv('WAITLIST_POLL_INTERVAL', '60'))
+
+# Снимок каталога врачей на диске: быстрый старт и работа при недоступном API ("" - отключить)
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', 'catalog.snapshot')
+CATALOG_SNAPSHOT_INTERVAL = int(os.getenv('CATALOG_SNAPSHOT_INTERVAL', '300'))
+
+# Сколько секунд при остановке ждать незавершенные обработчики и запросы к API
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '25'))
+
+# Профилирование обработчиков (можно включить командой /profile)
+PROFILE_HANDLERS = os.getenv('PROFILE_HANDLERS', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.1'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Bot создается в main(): импорт модуля не требует токена и не трогает сеть
+bot = None
 dp = Dispatcher(storage=MemoryStorage())
 
-# Временное хранение токенов пользователей
-user_tokens = {}
+# Незавершенные апдейты - их дожидаемся при остановке
+in_flight = InFlightMiddleware()
+dp.update.outer_middleware(in_flight)
+
+# Замер времени обработчиков (первым - учитывает ожидание в очереди)
+metrics_middleware = metrics.MetricsMiddleware()
+dp.message.middleware(metrics_middleware)
+dp.callback_query.middleware(metrics_middleware)
+dp.inline_query.middleware(metrics_middleware)
+
+# Один экземпляр на оба типа апдейтов - общий лимит на пользователя
+throttling = ThrottlingMiddleware(THROTTLE_RATE, THROTTLE_BURST, HEAVY_CONCURRENCY)
+dp.message.middleware(throttling)
+dp.callback_query.middleware(throttling)
+
+# Трассировка: апдейт -> обработчик -> запросы к API (TRACE_FILE)
+dp.update.outer_middleware(tracing.UpdateTracingMiddleware())
+dp.message.middleware(tracing.HandlerTracingMiddleware())
+dp.callback_query.middleware(tracing.HandlerTracingMiddleware())
+dp.inline_query.middleware(tracing.HandlerTracingMiddleware())
+
+profiler = HandlerProfiler(PROFILE_DIR, PROFILE_SAMPLE_RATE)
+if PROFILE_HANDLERS:
+    profiler.enable()
+# Один экземпляр на оба типа апдейтов - профилируется одно выполнение за раз
+profiling_middleware = ProfilingMiddleware(profiler)
+dp.message.middleware(profiling_middleware)
+dp.callback_query.middleware(profiling_middleware)
+
+# Очередь ожидания освободившегося времени (сохраняется вместе с сессиями)
+waitlist = Waitlist()
+
+# Хранение токенов пользователей (и агрегатов статистики)
+user_tokens = SessionStore(SESSION_STORE_PATH, dp.storage, waitlist)
+
+# Общий клиент API (одна HTTP-сессия и кэши на всех пользователей)
+api_client = MedicalAPIClient(
+    user_statistics=user_tokens.statistics,
+    trace_configs=[metrics.client_trace_config(), tracing.client_trace_config()],
+    stream_appointments=API_STREAM_APPOINTMENTS
+)
+
+# Объявления всем вошедшим пользователям
+broadcaster = Broadcaster(user_tokens, BROADCAST_STATE_PATH or None, BROADCAST_RATE)
+
+# Замер фаз запуска и фоновые задачи (останавливаются при выключении)
+startup_timer = StartupTimer(STARTED_AT)
+background_tasks = []
+
+# Фоновые задачи предзагрузки по пользователям
+prefetch_tasks = {}
 
 # Быстрые ответы на частые вопросы
 QUICK_REPLIES = {
@@ -41,6 +150,24 @@ class BookingState(StatesGroup):
     selecting_time = State()
     confirming_appointment = State()
 
+# Поиск ближайшего свободного времени: ключ кнопки -> специализация (None - все врачи)
+EARLIEST_SPECIALIZATIONS = {
+    "cardiology": "Кардиология",
+    "neurology": "Неврология",
+    "ophthalmology": "Офтальмология",
+    "dentistry": "Стоматология",
+    "therapy": "Терапия",
+    "surgery": "Хирургия",
+    "all": None
+}
+EARLIEST_SLOTS_LIMIT = 5
+
+# Inline-режим (@bot запрос): результатов на страницу (максимум Telegram - 50),
+# сколько ждать каталог, если его нет в кэше, и сколько Telegram кэширует ответ
+INLINE_RESULTS_LIMIT = 50
+INLINE_QUERY_TIMEOUT = 2.0
+INLINE_CACHE_TIME = DOCTORS_TTL
+
 @dp.message(CommandStart())
 async def start_handler(message: types.Message):
     """Handle /start command with main menu"""
@@ -143,7 +270,7 @@ async def my_appointments_callback(callback: types.CallbackQuery):
     )
     await callback.answer()
 
-@dp.callback_query(F.data == "book_appointment")
+@dp.callback_query(F.data == "book_appointment", flags={"heavy": True})
 async def book_appointment_callback(callback: types.CallbackQuery, state: FSMContext):
     """Start appointment booking process"""
 
@@ -162,28 +289,27 @@ async def book_appointment_callback(callback: types.CallbackQuery, state: FSMCon
     # Получаем список врачей
     access_token = user_tokens[user_id]["token"]
     
-    async with MedicalAPIClient() as api_client:
-        doctors = await api_client.get_doctors_by_specialization(None, access_token)
-        
-        if not doctors:
-            await callback.message.edit_text(
-                "❌ **Врачи не найдены**\n\n"
-                "В данный момент нет доступных врачей.",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
+    doctors = await api_client.get_doctors_by_specialization(None, access_token)
+    
+    if not doctors:
         await callback.message.edit_text(
-            "👨⚕️ **Выберите врача для записи:**\n\n"
-            "Доступные врачи:",
-            reply_markup=BotKeyboards.doctors_for_booking(doctors),
+            "❌ **Врачи не найдены**\n\n"
+            "В данный момент нет доступных врачей.",
+            reply_markup=BotKeyboards.back_to_main(),
             parse_mode="Markdown"
         )
-        
-        await state.set_state(BookingState.selecting_doctor)
         await callback.answer()
+        return
+    
+    await callback.message.edit_text(
+        "👨⚕️ **Выберите врача для записи:**\n\n"
+        "Доступные врачи:" + stale_note(),
+        reply_markup=BotKeyboards.doctors_for_booking(doctors),
+        parse_mode="Markdown"
+    )
+    
+    await state.set_state(BookingState.selecting_doctor)
+    await callback.answer()
 
 @dp.callback_query(F.data == "login")
 async def login_callback(callback: types.CallbackQuery):
@@ -213,7 +339,7 @@ async def register_callback(callback: types.CallbackQuery):
     )
     await callback.answer()
 
-@dp.callback_query(F.data == "my_statistics")
+@dp.callback_query(F.data == "my_statistics", flags={"heavy": True})
 async def my_statistics_callback(callback: types.CallbackQuery):
     """Show user statistics"""
     user_id = callback.from_user.id
@@ -231,66 +357,35 @@ async def my_statistics_callback(callback: types.CallbackQuery):
     access_token = user_tokens[user_id]["token"]
     user_email = user_tokens[user_id]["email"]
     
-    async with MedicalAPIClient() as api_client:
-        stats = await api_client.get_user_statistics(user_email, access_token)
-        
-        if not stats:
-            await callback.message.edit_text(
-                "❌ **Ошибка получения статистики**\n\n"
-                "Попробуйте позже.",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
-        # Format statistics message
-        stats_text = f"📊 **Моя статистика**\n\n"
-        
-        # Total appointments
-        total = stats.get('total_appointments', 0)
-        stats_text += f"📋 **Общее количество посещений:** {total}\n\n"
-        
-        # Favorite doctors
-        favorite_doctors = stats.get('favorite_doctors', [])
-        if favorite_doctors:
-            stats_text += "👨⚕️ **Любимые врачи:**\n"
-            for i, doctor in enumerate(favorite_doctors, 1):
-                stats_text += f"{i}. {doctor['name']} - {doctor['visits']} посещений\n"
-            stats_text += "\n"
-        
-        # Specializations
-        specializations = stats.get('specializations', {})
-        if specializations:
-            stats_text += "🏥 **По специализациям:**\n"
-            for spec, count in list(specializations.items())[:3]:
-                stats_text += f"• {spec}: {count} посещений\n"
-            stats_text += "\n"
-        
-        # Monthly activity
-        monthly_visits = stats.get('monthly_visits', {})
-        if monthly_visits:
-            stats_text += "📅 **Последние месяцы:**\n"
-            sorted_months = sorted(monthly_visits.items(), reverse=True)[:3]
-            for month, count in sorted_months:
-                try:
-                    from datetime import datetime
-                    month_name = datetime.strptime(month, '%Y-%m').strftime('%B %Y')
-                    stats_text += f"• {month_name}: {count} посещений\n"
-                except:
-                    stats_text += f"• {month}: {count} посещений\n"
-        
-        if total == 0:
-            stats_text = "📊 **Моя статистика**\n\n📋 У вас пока нет записей к врачам.\n\nЗапишитесь на прием чтобы увидеть статистику!"
-        
+    stats = await api_client.get_user_statistics(user_email, access_token)
+    
+    if not stats:
         await callback.message.edit_text(
-            stats_text,
+            "❌ **Ошибка получения статистики**\n\n"
+            "Попробуйте позже.",
             reply_markup=BotKeyboards.back_to_main(),
             parse_mode="Markdown"
         )
+        await callback.answer()
+        return
     
+    stats_text = BotMessages.statistics(stats)
+    
+    await callback.message.edit_text(
+        stats_text,
+        reply_markup=BotKeyboards.back_to_main(),
+        parse_mode="Markdown"
+    )
+
     await callback.answer()
 
+def stale_note() -> str:
+    """Warning for catalog views served from an outdated copy"""
+    since = api_client.catalog_stale_since()
+    if since is None:
+        return ""
+    return f"\n\n⚠️ _Сервер недоступен, данные от {datetime.fromtimestamp(since):%d.%m.%Y %H:%M}_"
+
 @dp.callback_query(F.data == "view_all_doctors")
 async def view_all_doctors_callback(callback: types.CallbackQuery):
     """Show all doctors regardless of specialization"""
@@ -301,87 +396,90 @@ async def view_all_doctors_callback(callback: types.CallbackQuery):
     if user_id in user_tokens:
         access_token = user_tokens[user_id]["token"]
     
-    async with MedicalAPIClient() as api_client:
-        doctors = await api_client.get_doctors_by_specialization(None, access_token)
-        
-        if not doctors:
-            await callback.message.edit_text(
-                "❌ **Врачи не найдены**\n\n"
-                "В данный момент нет доступных врачей.",
-                reply_markup=BotKeyboards.doctors_menu(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
-        # Format doctors list
-        doctors_text = "👨⚕️ **Все врачи:**\n\n"
-        
-        for i, doctor in enumerate(doctors[:10], 1):  # Show max 10 doctors
-            name = f"{doctor.get('name', 'Неизвестно')} {doctor.get('surname', '')}"
-            spec = doctor.get('specialization', 'Не указано')
-            
-            doctors_text += (
-                f"**{i}. {name}**\n"
-                f"🏥 Специализация: {spec}\n\n"
-            )
-        
-        if len(doctors) > 10:
-            doctors_text += f"... и еще {len(doctors) - 10} врачей\n\n"
-        
-        doctors_text += "Для записи к врачу используйте главное меню."
-        
+    doctors = await api_client.get_doctors_by_specialization(None, access_token)
+    
+    if not doctors:
         await callback.message.edit_text(
-            doctors_text,
+            "❌ **Врачи не найдены**\n\n"
+            "В данный момент нет доступных врачей.",
             reply_markup=BotKeyboards.doctors_menu(),
             parse_mode="Markdown"
         )
+        await callback.answer()
+        return
     
+    # Одинаковый текст для всех пользователей - рендерим раз на версию каталога
+    doctors_text = render_cached(
+        ("doctors", api_client.data_version("doctors"), 0, "all", False),
+        lambda: BotMessages.doctors_list(doctors, "Все врачи")
+    )
+    
+    await callback.message.edit_text(
+        doctors_text + stale_note(),
+        reply_markup=BotKeyboards.doctors_menu(),
+        parse_mode="Markdown"
+    )
+
     await callback.answer()
 
 # ==================== BOOKING PROCESS HANDLERS ====================
 
+async def booking_doctor(data: dict, user_id: int):
+    """Name and specialization of doctor chosen in booking state"""
+    # В FSM хранится только doctor_id, остальное берем из кэша каталога
+    doctor_id = data.get('doctor_id')
+    doctor = None
+    if doctor_id and user_id in user_tokens:
+        doctor = await api_client.get_doctor(doctor_id, user_tokens[user_id]["token"])
+    if not doctor:
+        return 'Неизвестный врач', 'Не указано'
+    return doctor.full_name, doctor.specialization
+
 @dp.callback_query(F.data.startswith("select_doctor_"))
 async def select_doctor_callback(callback: types.CallbackQuery, state: FSMContext):
     """Handle doctor selection"""
+    user_id = callback.from_user.id
+    if user_id not in user_tokens:
+        await callback.message.edit_text(
+            "❌ **Требуется авторизация**\n\n"
+            "Для записи к врачу необходимо войти в систему.",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+        return
+    
     doctor_id = callback.data.replace("select_doctor_", "")
     
     # Save doctor info to state
     await state.update_data(doctor_id=doctor_id)
     
     # Get doctor info for display
-    user_id = callback.from_user.id
     access_token = user_tokens[user_id]["token"]
     
     try:
-        async with MedicalAPIClient() as api_client:
-            doctor_info = await api_client.get_doctor_info(doctor_id, access_token)
+        doctor_info = await api_client.get_doctor(doctor_id, access_token)
+        
+        if doctor_info:
+            await callback.message.edit_text(
+                f"👨⚕️ **Выбран врач: {doctor_info.full_name}**\n\n"
+                f"🏥 Специализация: {doctor_info.specialization}\n\n"
+                f"📅 **Выберите дату для записи:**",
+                reply_markup=BotKeyboards.calendar(datetime.now().year, datetime.now().month),
+                parse_mode="Markdown"
+            )
             
-            if doctor_info:
-                doctor_name = f"{doctor_info['name']} {doctor_info['surname']}"
-                specialization = doctor_info['specialization']
-                
-                await state.update_data(
-                    doctor_name=doctor_name,
-                    specialization=specialization
-                )
-                
-                await callback.message.edit_text(
-                    f"👨⚕️ **Выбран врач: {doctor_name}**\n\n"
-                    f"🏥 Специализация: {specialization}\n\n"
-                    f"📅 **Выберите дату для записи:**",
-                    reply_markup=BotKeyboards.calendar(datetime.now().year, datetime.now().month),
-                    parse_mode="Markdown"
-                )
-                
-                await state.set_state(BookingState.selecting_time)
-            else:
-                await callback.message.edit_text(
-                    "❌ **Ошибка получения данных врача**\n\n"
-                    "Попробуйте выбрать другого врача.",
-                    reply_markup=BotKeyboards.back_to_main(),
-                    parse_mode="Markdown"
-                )
+            await state.set_state(BookingState.selecting_time)
+        else:
+            await callback.message.edit_text(
+                "❌ **Ошибка получения данных врача**\n\n"
+                "Попробуйте выбрать другого врача.",
+                reply_markup=BotKeyboards.back_to_main(),
+                parse_mode="Markdown"
+            )
+    except AuthenticationError:
+        # Сессия истекла - выход и просьба войти заново (authentication_error_handler)
+        raise
     except Exception as e:
         await callback.message.edit_text(
             "❌ **Ошибка системы**\n\n"
@@ -392,20 +490,13 @@ async def select_doctor_callback(callback: types.CallbackQuery, state: FSMContex
     
     await callback.answer()
 
-@dp.callback_query(F.data.startswith("select_time_"))
-async def select_time_callback(callback: types.CallbackQuery, state: FSMContext):
-    """Handle time selection"""
-    selected_time = callback.data.replace("select_time_", "")
-    
-    # Save time to state
-    await state.update_data(time=selected_time)
-    
-    # Get saved data for confirmation
+async def show_booking_confirmation(callback: types.CallbackQuery, state: FSMContext):
+    """Ask to confirm doctor/date/time saved in state"""
     data = await state.get_data()
     
-    doctor_name = data.get('doctor_name', 'Неизвестный врач')
-    specialization = data.get('specialization', 'Не указано')
+    doctor_name, specialization = await booking_doctor(data, callback.from_user.id)
     appointment_date = data.get('date', '')
+    selected_time = data.get('time', '')
     
     # Format date for display
     if appointment_date:
@@ -428,12 +519,101 @@ async def select_time_callback(callback: types.CallbackQuery, state: FSMContext)
     )
     
     await state.set_state(BookingState.confirming_appointment)
+
+@dp.callback_query(F.data.startswith("select_time_"))
+async def select_time_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Handle time selection"""
+    selected_time = callback.data.replace("select_time_", "")
+    
+    # Save time to state (new key - it's a new booking attempt)
+    await state.update_data(time=selected_time, booking_key=uuid.uuid4().hex)
+    
+    await show_booking_confirmation(callback, state)
+    await callback.answer()
+
+@dp.callback_query(F.data == "find_earliest")
+async def find_earliest_callback(callback: types.CallbackQuery):
+    """Choose specialization for earliest free slot search"""
+    await callback.message.edit_text(
+        "⏱ **Ближайшее свободное время**\n\n"
+        "Выберите специализацию, покажем ближайшие свободные приемы всех ее врачей:",
+        reply_markup=BotKeyboards.earliest_specializations(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("earliest_"), flags={"heavy": True})
+async def earliest_slots_callback(callback: types.CallbackQuery):
+    """Earliest free slots across doctors of specialization"""
+    spec_key = callback.data.replace("earliest_", "")
+    if spec_key not in EARLIEST_SPECIALIZATIONS:
+        return
+    
+    user_id = callback.from_user.id
+    if user_id not in user_tokens:
+        await callback.message.edit_text(
+            "❌ **Требуется авторизация**\n\n"
+            "Для записи к врачу необходимо войти в систему.",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+        return
+    
+    specialization = EARLIEST_SPECIALIZATIONS[spec_key]
+    slots = await api_client.get_earliest_slots(
+        specialization, BOOKING_TIMES, user_tokens[user_id]["token"], limit=EARLIEST_SLOTS_LIMIT
+    )
+    
+    title = specialization or "все врачи"
+    if not slots:
+        await callback.message.edit_text(
+            f"❌ **Свободного времени нет**\n\n"
+            f"{title}: свободных приемов в ближайшие две недели не найдено.",
+            reply_markup=BotKeyboards.earliest_specializations(),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+        return
+    
+    await callback.message.edit_text(
+        f"⏱ **Ближайшее свободное время ({title})**\n\n"
+        f"Выберите прием для записи:",
+        reply_markup=BotKeyboards.earliest_slots(slots),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("slot_"))
+async def earliest_slot_selected_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Book slot chosen from earliest free slots"""
+    if callback.from_user.id not in user_tokens:
+        await callback.answer("❌ Требуется авторизация")
+        return
+    
+    doctor_id, date, selected_time = callback.data.replace("slot_", "").split("_")
+    await state.update_data(
+        doctor_id=doctor_id, date=date, time=selected_time, booking_key=uuid.uuid4().hex
+    )
+    
+    await show_booking_confirmation(callback, state)
     await callback.answer()
 
-@dp.callback_query(F.data == "confirm_booking")
+@dp.callback_query(F.data == "confirm_booking", flags={"heavy": True})
 async def confirm_booking_callback(callback: types.CallbackQuery, state: FSMContext):
     """Confirm and create appointment"""
     user_id = callback.from_user.id
+    if user_id not in user_tokens:
+        await state.clear()
+        await callback.message.edit_text(
+            "❌ **Требуется авторизация**\n\n"
+            "Сессия завершилась, войдите в систему и выберите время заново.",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+        return
+    
     access_token = user_tokens[user_id]["token"]
     user_email = user_tokens[user_id]["email"]
     
@@ -442,44 +622,53 @@ async def confirm_booking_callback(callback: types.CallbackQuery, state: FSMCont
     doctor_id = data.get('doctor_id')
     date = data.get('date')
     time = data.get('time')
-    doctor_name = data.get('doctor_name')
+    booking_key = data.get('booking_key')
     
-    async with MedicalAPIClient() as api_client:
-        appointment = await api_client.create_appointment(
-            doctor_id, date, time, user_email, access_token
-        )
-        
-        if appointment and not appointment.get('error'):
-            room_number = appointment.get('room_number', 'Неизвестно')
-            await callback.message.edit_text(
-                f"🎉 **Запись успешно создана!**\n\n"
-                f"📋 Номер записи: #{str(appointment.get('id', 'N/A'))[:8]}\n"
-                f"👨⚕️ Врач: {doctor_name}\n"
-                f"📅 Дата: {date}\n"
-                f"⏰ Время: {time}\n"
-                f"🏠 Комната: {room_number}\n\n"
-                f"✅ Запись сохранена в системе!",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
-        elif appointment and appointment.get('error') == 'no_rooms':
-            await callback.message.edit_text(
-                "❌ **Ошибка создания записи**\n\n"
-                f"🏠 {appointment.get('message')}\n\n"
-                "Обратитесь к администратору для создания комнат.",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
-        else:
-            await callback.message.edit_text(
-                "❌ **Ошибка создания записи**\n\n"
-                "Проверьте:\n"
-                "• Работает ли FastAPI сервер\n"
-                "• Правильность данных",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
+    # Повторное нажатие: запись уже создана (состояние очищено) или еще создается
+    if not doctor_id or not booking_key:
+        await callback.answer("✅ Запись уже обработана")
+        return
+    if api_client.is_in_flight(booking_key):
+        await callback.answer("⏳ Запись уже создается...")
+        return
     
+    appointment = await api_client.create_appointment(
+        doctor_id, date, time, user_email, access_token,
+        idempotency_key=booking_key
+    )
+    
+    if appointment and not appointment.get('error'):
+        doctor_name, _ = await booking_doctor(data, user_id)
+        room_number = appointment.get('room_number', 'Неизвестно')
+        await callback.message.edit_text(
+            f"🎉 **Запись успешно создана!**\n\n"
+            f"📋 Номер записи: #{str(appointment.get('id', 'N/A'))[:8]}\n"
+            f"👨⚕️ Врач: {doctor_name}\n"
+            f"📅 Дата: {date}\n"
+            f"⏰ Время: {time}\n"
+            f"🏠 Комната: {room_number}\n\n"
+            f"✅ Запись сохранена в системе!",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+    elif appointment and appointment.get('error') == 'no_rooms':
+        await callback.message.edit_text(
+            "❌ **Ошибка создания записи**\n\n"
+            f"🏠 {appointment.get('message')}\n\n"
+            "Обратитесь к администратору для создания комнат.",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+    else:
+        await callback.message.edit_text(
+            "❌ **Ошибка создания записи**\n\n"
+            "Проверьте:\n"
+            "• Работает ли FastAPI сервер\n"
+            "• Правильность данных",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+
     await state.clear()
     await callback.answer()
 
@@ -534,53 +723,36 @@ async def search_specialization_callback(callback: types.CallbackQuery):
     if user_id in user_tokens:
         access_token = user_tokens[user_id]["token"]
     
-    async with MedicalAPIClient() as api_client:
-        doctors = await api_client.get_doctors_by_specialization(
-            specialization if specialization != "all" else None, 
-            access_token
-        )
-        
-        if not doctors:
-            await callback.message.edit_text(
-                f"❌ **Врачи не найдены**\n\n"
-                f"По специализации '{specialization}' врачи не найдены.",
-                reply_markup=BotKeyboards.search_specializations(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
-        # Format doctors list
-        doctors_text = "👨⚕️ **Врачи"
-        if specialization != "all":
-            doctors_text += f" - {specialization}"
-        doctors_text += ":**\n\n"
-        
-        for i, doctor in enumerate(doctors[:10], 1):  # Show max 10 doctors
-            name = f"{doctor.get('name', 'Неизвестно')} {doctor.get('surname', '')}"
-            spec = doctor.get('specialization', 'Не указано')
-            experience = doctor.get('experience_years', 'Не указано')
-            
-            doctors_text += (
-                f"**{i}. {name}**\n"
-                f"🏥 Специализация: {spec}\n"
-                f"📅 Опыт: {experience} лет\n\n"
-            )
-        
-        if len(doctors) > 10:
-            doctors_text += f"... и еще {len(doctors) - 10} врачей\n\n"
-        
-        doctors_text += "Для записи к врачу используйте главное меню."
-        
+    doctors = await api_client.get_doctors_by_specialization(
+        specialization if specialization != "all" else None, 
+        access_token
+    )
+    
+    if not doctors:
         await callback.message.edit_text(
-            doctors_text,
+            f"❌ **Врачи не найдены**\n\n"
+            f"По специализации '{specialization}' врачи не найдены.",
             reply_markup=BotKeyboards.search_specializations(),
             parse_mode="Markdown"
         )
+        await callback.answer()
+        return
+    
+    title = "Врачи" if specialization == "all" else f"Врачи - {specialization}"
+    doctors_text = render_cached(
+        ("doctors", api_client.data_version("doctors"), 0, specialization, True),
+        lambda: BotMessages.doctors_list(doctors, title, show_experience=True)
+    )
     
+    await callback.message.edit_text(
+        doctors_text + stale_note(),
+        reply_markup=BotKeyboards.search_specializations(),
+        parse_mode="Markdown"
+    )
+
     await callback.answer()
 
-@dp.callback_query(F.data == "view_appointments")
+@dp.callback_query(F.data == "view_appointments", flags={"heavy": True})
 async def view_appointments_callback(callback: types.CallbackQuery):
     """Show user appointments"""
     user_id = callback.from_user.id
@@ -598,35 +770,33 @@ async def view_appointments_callback(callback: types.CallbackQuery):
     access_token = user_tokens[user_id]["token"]
     user_email = user_tokens[user_id]["email"]
     
-    async with MedicalAPIClient() as api_client:
-        appointments = await api_client.get_user_appointments(user_email, access_token)
-        
-        if not appointments:
-            await callback.message.edit_text(
-                "📋 **Ваши записи**\n\n"
-                "У вас пока нет записей к врачам.",
-                reply_markup=BotKeyboards.back_to_main(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
-        appointments_text = "📋 **Ваши записи:**\n\n"
-        
-        for i, appointment in enumerate(appointments[:5], 1):
-            appointments_text += f"**{i}.** Запись #{appointment.get('id', 'N/A')}\n"
-            appointments_text += f"📅 Дата: {appointment.get('datetime', 'Не указана')}\n\n"
-        
+    appointments = await api_client.get_user_appointments(user_email, access_token)
+    
+    if not appointments:
         await callback.message.edit_text(
-            appointments_text,
-            reply_markup=BotKeyboards.appointments_menu(),
+            "📋 **Ваши записи**\n\n"
+            "У вас пока нет записей к врачам.",
+            reply_markup=BotKeyboards.back_to_main(),
             parse_mode="Markdown"
         )
+        await callback.answer()
+        return
+    
+    appointments_text = render_cached(
+        ("appointments", user_email, api_client.data_version(user_email), 0),
+        lambda: BotMessages.appointments_list(appointments)
+    )
     
+    await callback.message.edit_text(
+        appointments_text,
+        reply_markup=BotKeyboards.appointments_menu(),
+        parse_mode="Markdown"
+    )
+
     await callback.answer()
 
-@dp.callback_query(F.data == "cancel_appointments")
-async def cancel_appointments_callback(callback: types.CallbackQuery):
+@dp.callback_query(F.data == "cancel_appointments", flags={"heavy": True})
+async def cancel_appointments_callback(callback: types.CallbackQuery, state: FSMContext):
     """Show appointments for cancellation"""
     user_id = callback.from_user.id
     
@@ -643,31 +813,129 @@ async def cancel_appointments_callback(callback: types.CallbackQuery):
     access_token = user_tokens[user_id]["token"]
     user_email = user_tokens[user_id]["email"]
     
-    async with MedicalAPIClient() as api_client:
-        appointments = await api_client.get_user_appointments(user_email, access_token)
-        
-        if not appointments:
-            await callback.message.edit_text(
-                "📋 **Отмена записей**\n\n"
-                "У вас нет записей для отмены.",
-                reply_markup=BotKeyboards.appointments_menu(),
-                parse_mode="Markdown"
-            )
-            await callback.answer()
-            return
-        
+    appointments = await api_client.get_user_appointments(user_email, access_token)
+    
+    if not appointments:
         await callback.message.edit_text(
-            "❌ **Выберите запись для отмены:**\n\n"
-            "Нажмите на запись, которую хотите отменить:",
-            reply_markup=BotKeyboards.appointments_for_cancellation(appointments),
+            "📋 **Отмена записей**\n\n"
+            "У вас нет записей для отмены.",
+            reply_markup=BotKeyboards.appointments_menu(),
             parse_mode="Markdown"
         )
+        await callback.answer()
+        return
     
+    # Выбор начинается заново при каждом открытии списка
+    await state.update_data(cancel_selected=[])
+    
+    await callback.message.edit_text(
+        "❌ **Выберите записи для отмены:**\n\n"
+        "Отметьте одну или несколько записей и нажмите «Отменить выбранные»:",
+        reply_markup=BotKeyboards.appointments_for_cancellation(appointments),
+        parse_mode="Markdown"
+    )
+
     await callback.answer()
 
-@dp.callback_query(F.data.startswith("cancel_appointment_"))
+@dp.callback_query(F.data.startswith("cancel_toggle_"))
+async def cancel_toggle_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Select/deselect appointment for bulk cancellation"""
+    appointment_id = callback.data.replace("cancel_toggle_", "")
+    user_id = callback.from_user.id
+    
+    if user_id not in user_tokens:
+        await callback.answer("❌ Требуется авторизация")
+        return
+    
+    data = await state.get_data()
+    selected = list(data.get('cancel_selected', []))
+    if appointment_id in selected:
+        selected.remove(appointment_id)
+    else:
+        selected.append(appointment_id)
+    await state.update_data(cancel_selected=selected)
+    
+    appointments = await api_client.get_user_appointments(
+        user_tokens[user_id]["email"], user_tokens[user_id]["token"]
+    )
+    await callback.message.edit_reply_markup(
+        reply_markup=BotKeyboards.appointments_for_cancellation(appointments, selected)
+    )
+    await callback.answer()
+
+@dp.callback_query(F.data == "cancel_selected")
+async def cancel_selected_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Ask to confirm cancellation of selected appointments"""
+    data = await state.get_data()
+    selected = data.get('cancel_selected', [])
+    
+    if not selected:
+        await callback.answer("Не выбрано ни одной записи")
+        return
+    
+    await callback.message.edit_text(
+        f"❌ **Отменить выбранные записи ({len(selected)})?**\n\n"
+        "Отмену нельзя будет вернуть.",
+        reply_markup=BotKeyboards.bulk_cancel_confirmation(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@dp.callback_query(F.data == "cancel_confirm", flags={"heavy": True})
+async def cancel_confirm_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Cancel all selected appointments"""
+    user_id = callback.from_user.id
+    
+    if user_id not in user_tokens:
+        await callback.message.edit_text(
+            "❌ **Требуется авторизация**",
+            reply_markup=BotKeyboards.back_to_main(),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+        return
+    
+    data = await state.get_data()
+    selected = data.get('cancel_selected', [])
+    if not selected:
+        # Повторное нажатие после отмены
+        await callback.answer("✅ Отмена уже обработана")
+        return
+    await state.update_data(cancel_selected=[])
+    
+    access_token = user_tokens[user_id]["token"]
+    user_email = user_tokens[user_id]["email"]
+    
+    appointments = await api_client.get_user_appointments(user_email, access_token)
+    by_id = {appointment.id: appointment for appointment in appointments}
+    
+    outcomes = await api_client.cancel_appointments(selected, access_token, user_email)
+    
+    lines = []
+    for appointment_id, success in outcomes.items():
+        appointment = by_id.get(appointment_id)
+        label = f"{appointment.date} {appointment.time}" if appointment else f"#{appointment_id[:8]}"
+        lines.append(f"{'✅' if success else '❌'} {label}")
+    cancelled = sum(outcomes.values())
+    
+    await callback.message.edit_text(
+        f"📋 **Отменено записей: {cancelled} из {len(outcomes)}**\n\n"
+        + "\n".join(lines),
+        reply_markup=BotKeyboards.appointments_menu(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+    
+    for appointment_id, success in outcomes.items():
+        appointment = by_id.get(appointment_id)
+        if success and appointment and appointment.starts_at:
+            await notify_waitlist(
+                callback.bot, appointment.doctor_id, appointment.date, [appointment.time], access_token
+            )
+
+@dp.callback_query(F.data.startswith("cancel_appointment_"), flags={"heavy": True})
 async def cancel_appointment_callback(callback: types.CallbackQuery):
-    """Cancel specific appointment"""
+    """Cancel specific appointment (buttons of older messages)"""
     appointment_id = callback.data.replace("cancel_appointment_", "")
     user_id = callback.from_user.id
     
@@ -681,27 +949,79 @@ async def cancel_appointment_callback(callback: types.CallbackQuery):
         return
     
     access_token = user_tokens[user_id]["token"]
+    user_email = user_tokens[user_id]["email"]
     
-    async with MedicalAPIClient() as api_client:
-        success = await api_client.cancel_appointment(appointment_id, access_token)
-        
-        if success:
-            await callback.message.edit_text(
-                "✅ **Запись успешно отменена!**\n\n"
-                f"Запись #{appointment_id[:8]} была удалена из системы.",
-                reply_markup=BotKeyboards.appointments_menu(),
-                parse_mode="Markdown"
-            )
-        else:
-            await callback.message.edit_text(
-                "❌ **Ошибка отмены записи**\n\n"
-                "Не удалось отменить запись. Возможно, она уже была отменена.",
-                reply_markup=BotKeyboards.appointments_menu(),
-                parse_mode="Markdown"
-            )
+    if api_client.is_in_flight(cancel_key(appointment_id)):
+        await callback.answer("⏳ Запись уже отменяется...")
+        return
+    
+    # Время отменяемой записи - для очереди ожидания
+    appointments = await api_client.get_user_appointments(user_email, access_token)
+    appointment = next((a for a in appointments if a.id == appointment_id), None)
+    
+    success = await api_client.cancel_appointment(appointment_id, access_token, user_email)
     
+    if success:
+        await callback.message.edit_text(
+            "✅ **Запись успешно отменена!**\n\n"
+            f"Запись #{appointment_id[:8]} была удалена из системы.",
+            reply_markup=BotKeyboards.appointments_menu(),
+            parse_mode="Markdown"
+        )
+        if appointment and appointment.starts_at:
+            await notify_waitlist(
+                callback.bot, appointment.doctor_id, appointment.date, [appointment.time], access_token
+            )
+    else:
+        await callback.message.edit_text(
+            "❌ **Ошибка отмены записи**\n\n"
+            "Не удалось отменить запись. Возможно, она уже была отменена.",
+            reply_markup=BotKeyboards.appointments_menu(),
+            parse_mode="Markdown"
+        )
+
     await callback.answer()
 
+# ==================== INLINE MODE ====================
+
+@dp.inline_query()
+async def inline_doctors_handler(inline_query: types.InlineQuery):
+    """@bot <query>: doctors from catalog, best matches first"""
+    # Ответ нужен за несколько секунд: медленный бэкенд не ждем, общий запрос
+    # каталога продолжает выполняться в фоне для следующих запросов
+    try:
+        doctors = await asyncio.wait_for(
+            api_client.get_doctors_by_specialization(None), INLINE_QUERY_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        doctors = []
+    
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    matches = rank_doctors(doctors, inline_query.query)
+    page = matches[offset:offset + INLINE_RESULTS_LIMIT]
+    
+    results = [
+        InlineQueryResultArticle(
+            id=doctor.id,
+            title=doctor.full_name,
+            description=doctor.specialization or 'Специализация не указана',
+            input_message_content=InputTextMessageContent(
+                message_text=BotMessages.doctor_card(doctor), parse_mode="Markdown"
+            )
+        )
+        for doctor in page
+    ]
+    next_offset = str(offset + INLINE_RESULTS_LIMIT) if len(matches) > offset + INLINE_RESULTS_LIMIT else ""
+    
+    # Каталог общий для всех - ответ кэшируется Telegram для всех пользователей;
+    # пустой ответ из-за недоступного бэкенда не кэшируем
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME if doctors else 0,
+        is_personal=False,
+        next_offset=next_offset
+    )
+
 # ==================== CALENDAR HANDLERS ====================
 
 @dp.callback_query(F.data.startswith("date_"))
@@ -714,11 +1034,17 @@ async def date_selected_callback(callback: types.CallbackQuery, state: FSMContex
     
     # Get saved data
     data = await state.get_data()
-    doctor_name = data.get('doctor_name', 'Неизвестный врач')
-    specialization = data.get('specialization', 'Не указано')
+    doctor_name, specialization = await booking_doctor(data, callback.from_user.id)
+    
+    # Занятое время не предлагаем
+    booked_times = set()
+    user_id = callback.from_user.id
+    if user_id in user_tokens and data.get('doctor_id'):
+        booked_times = await api_client.get_booked_slots(
+            data['doctor_id'], selected_date, user_tokens[user_id]["token"]
+        )
     
     # Format date for display
-    from datetime import datetime
     date_obj = datetime.strptime(selected_date, "%Y-%m-%d")
     formatted_date = date_obj.strftime("%d.%m.%Y")
     
@@ -727,12 +1053,69 @@ async def date_selected_callback(callback: types.CallbackQuery, state: FSMContex
         f"🏥 Специализация: {specialization}\n"
         f"📅 Дата: {formatted_date}\n\n"
         f"⏰ **Выберите время:**",
-        reply_markup=BotKeyboards.booking_time_slots(),
+        reply_markup=BotKeyboards.booking_time_slots(booked_times),
         parse_mode="Markdown"
     )
     
     await callback.answer()
 
+@dp.callback_query(F.data.startswith("waitlist_"))
+async def waitlist_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Wait for booked time (or any time of fully booked day) to be freed"""
+    wanted = callback.data.replace("waitlist_", "")
+    data = await state.get_data()
+    
+    if callback.from_user.id not in user_tokens or not data.get('doctor_id') or not data.get('date'):
+        await callback.answer("❌ Начните запись заново")
+        return
+    
+    time_slot = None if wanted == "any" else wanted
+    waitlist.subscribe(callback.from_user.id, data['doctor_id'], data['date'], time_slot)
+    
+    await callback.answer(
+        f"🔔 Сообщим, если {'освободится ' + time_slot if time_slot else 'время освободится'}",
+        show_alert=True
+    )
+
+async def notify_waitlist(bot: Bot, doctor_id: str, date: str, freed_times, access_token: str = None):
+    """Offer freed times to waiting users, each time to the first one in queue
+
+    Doctor name comes from the catalog (with the canceller's token), never
+    with a waiting user's token.
+    """
+    now = datetime.now()
+    free = [t for t in freed_times if datetime.strptime(f"{date} {t}", "%Y-%m-%d %H:%M") > now]
+    if not free or (doctor_id, date) not in waitlist:
+        return
+    
+    try:
+        doctors = await api_client.get_doctors_by_specialization(None, access_token)
+        doctor = next((d for d in doctors if d.id == doctor_id), None)
+    except Exception:
+        doctor = None
+    doctor_name = doctor.full_name if doctor else "врач"
+    formatted_date = datetime.strptime(date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    
+    while free:
+        offers = waitlist.take(doctor_id, date, free)
+        free = []
+        for user_id, slot_time in offers:
+            try:
+                await bot.send_message(
+                    user_id,
+                    f"🔔 **Освободилось время!**\n\n"
+                    f"👨⚕️ Врач: {doctor_name}\n"
+                    f"📅 Дата: {formatted_date}\n"
+                    f"⏰ Время: {slot_time}\n\n"
+                    f"Успейте записаться:",
+                    reply_markup=BotKeyboards.waitlist_offer(doctor_id, date, slot_time),
+                    parse_mode="Markdown"
+                )
+            except Exception as e:
+                # Недоступному пользователю не дозвониться - время следующему в очереди
+                print(f"Waitlist notification error: {e}")
+                free.append(slot_time)
+
 @dp.callback_query(F.data.startswith("cal_prev_"))
 async def calendar_prev_callback(callback: types.CallbackQuery):
     """Handle previous month navigation"""
@@ -773,8 +1156,7 @@ async def calendar_next_callback(callback: types.CallbackQuery):
 async def select_date_callback(callback: types.CallbackQuery, state: FSMContext):
     """Show calendar for date selection"""
     data = await state.get_data()
-    doctor_name = data.get('doctor_name', 'Неизвестный врач')
-    specialization = data.get('specialization', 'Не указано')
+    doctor_name, specialization = await booking_doctor(data, callback.from_user.id)
     
     await callback.message.edit_text(
         f"👨⚕️ **Врач: {doctor_name}**\n"
@@ -792,6 +1174,51 @@ async def ignore_callback(callback: types.CallbackQuery):
 
 # ==================== LOGIN HANDLER ====================
 
+def start_prefetch(user_id: int):
+    """Warm up caches for freshly logged in user in background"""
+    cancel_prefetch(user_id)
+    
+    session = user_tokens[user_id]
+    task = asyncio.create_task(
+        api_client.warm_up_user(session["email"], session["token"])
+    )
+    prefetch_tasks[user_id] = task
+    
+    def _done(t):
+        if prefetch_tasks.get(user_id) is t:
+            del prefetch_tasks[user_id]
+        if not t.cancelled():
+            t.exception()  # Ошибки предзагрузки не важны
+    
+    task.add_done_callback(_done)
+
+def cancel_prefetch(user_id: int):
+    """Stop user's prefetch if it is still running"""
+    task = prefetch_tasks.pop(user_id, None)
+    if task:
+        task.cancel()
+
+def end_session(user_id: int):
+    """Forget user's token and stop work started for it"""
+    cancel_prefetch(user_id)
+    user_tokens.pop(user_id, None)
+    # Незавершенная запись без сессии не продолжится - не храним ее состояние
+    for key in [key for key in dp.storage.storage if key.user_id == user_id]:
+        del dp.storage.storage[key]
+
+@dp.message(Command("logout"))
+async def logout_handler(message: types.Message, state: FSMContext):
+    """Log out and forget user's token"""
+    end_session(message.from_user.id)
+    await state.clear()
+    
+    await message.answer(
+        "👋 **Вы вышли из системы**\n\n"
+        "Чтобы снова пользоваться записями, войдите в систему.",
+        reply_markup=BotKeyboards.main_menu(),
+        parse_mode="Markdown"
+    )
+
 @dp.message(F.text.contains(":"))
 async def handle_login_credentials(message: types.Message):
     """Handle login credentials in format email:password"""
@@ -799,30 +1226,30 @@ async def handle_login_credentials(message: types.Message):
     try:
         email, password = message.text.split(":", 1)
         
-        async with MedicalAPIClient() as api_client:
-            token = await api_client.authenticate_user(email.strip(), password.strip())
+        token = await api_client.authenticate_user(email.strip(), password.strip())
+        
+        if token:
+            # На диск сессия попадет при ближайшем периодическом сохранении
+            user_tokens.login(message.from_user.id, token, email.strip())
             
-            if token:
-                user_tokens[message.from_user.id] = {
-                    "token": token,
-                    "email": email.strip()
-                }
-                
-                await message.answer(
-                    "✅ **Успешный вход в систему!**\n\n"
-                    "Теперь вам доступны все функции бота.\n"
-                    "Используйте меню для навигации:",
-                    reply_markup=BotKeyboards.main_menu(),
-                    parse_mode="Markdown"
-                )
-            else:
-                await message.answer(
-                    "❌ **Ошибка входа**\n\n"
-                    "Неверный email или пароль.\n"
-                    "Попробуйте еще раз:",
-                    reply_markup=BotKeyboards.back_to_main(),
-                    parse_mode="Markdown"
-                )
+            if PREFETCH_ON_LOGIN:
+                start_prefetch(message.from_user.id)
+            
+            await message.answer(
+                "✅ **Успешный вход в систему!**\n\n"
+                "Теперь вам доступны все функции бота.\n"
+                "Используйте меню для навигации:",
+                reply_markup=BotKeyboards.main_menu(),
+                parse_mode="Markdown"
+            )
+        else:
+            await message.answer(
+                "❌ **Ошибка входа**\n\n"
+                "Неверный email или пароль.\n"
+                "Попробуйте еще раз:",
+                reply_markup=BotKeyboards.back_to_main(),
+                parse_mode="Markdown"
+            )
     except ValueError:
         await message.answer(
             "❌ **Неверный формат данных**\n\n"
@@ -873,6 +1300,45 @@ async def faq_answer_callback(callback: types.CallbackQuery):
     
     await callback.answer()
 
+# ==================== ADMIN HANDLERS ====================
+
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def profile_handler(message: types.Message):
+    """Toggle handler profiling: /profile on|off|dump"""
+    action = (message.text.split(maxsplit=1)[1:] or ["status"])[0].strip()
+    
+    if action == "on":
+        profiler.enable()
+        text = f"🔬 Профилирование включено (доля выборки {profiler.sample_rate})"
+    elif action == "off":
+        profiler.disable()
+        text = "🔬 Профилирование выключено"
+    elif action == "dump":
+        paths = profiler.dump()
+        text = "💾 Профили сохранены:\n" + "\n".join(paths) if paths else "Профилей пока нет"
+    else:
+        state_text = "включено" if profiler.enabled else "выключено"
+        text = f"🔬 Профилирование {state_text}\n\n{profiler.summary() or 'Выборок пока нет'}"
+    
+    await message.answer(text)
+
+@dp.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_handler(message: types.Message):
+    """Announcement to all users: /broadcast <text>|status|cancel"""
+    argument = (message.text.split(maxsplit=1)[1:] or ["status"])[0].strip()
+    
+    if argument == "status":
+        text = f"📢 {broadcaster.status()}"
+    elif argument == "cancel":
+        broadcaster.cancel()
+        text = "📢 Рассылка отменена"
+    elif broadcaster.start(message.bot, argument, message.from_user.id):
+        text = f"📢 Рассылка запущена для ~{len(user_tokens)} пользователей"
+    else:
+        text = "⏳ Уже идет другая рассылка. /broadcast status - прогресс, /broadcast cancel - отменить"
+    
+    await message.answer(text)
+
 # ==================== QUICK REPLIES HANDLER ====================
 
 @dp.message()
@@ -913,6 +1379,27 @@ async def quick_replies_handler(message: types.Message):
         parse_mode="Markdown"
     )
 
+# ==================== ERROR HANDLERS ====================
+
+@dp.errors(ExceptionTypeFilter(AuthenticationError))
+async def authentication_error_handler(event: types.ErrorEvent, bot: Bot):
+    """Backend rejected token - end session and ask to log in again"""
+    update = event.update
+    user = update.event.from_user
+    end_session(user.id)
+    
+    if update.callback_query:
+        await update.callback_query.answer()
+    
+    await bot.send_message(
+        user.id,
+        "🔐 **Сессия истекла**\n\n"
+        "Войдите в систему заново, чтобы продолжить.",
+        reply_markup=BotKeyboards.main_menu(),
+        parse_mode="Markdown"
+    )
+    return True
+
 # ==================== CATCH-ALL HANDLERS (MUST BE LAST) ====================
 
 @dp.callback_query()
@@ -922,31 +1409,236 @@ async def unknown_callback_handler(callback: types.CallbackQuery):
 
 
 
-async def set_bot_commands():
-    """Set bot commands for menu"""
-    commands = [
-        BotCommand(command="start", description="🏠 Главное меню"),
-        BotCommand(command="menu", description="📋 Показать меню"),
-    ]
+BOT_COMMANDS = [
+    BotCommand(command="start", description="🏠 Главное меню"),
+    BotCommand(command="menu", description="📋 Показать меню"),
+    BotCommand(command="logout", description="🚪 Выйти"),
+]
+
+async def set_bot_commands(bot: Bot):
+    """Set bot commands for menu (only if they changed since last start)"""
+    started = time.perf_counter()
+    digest = commands_hash(BOT_COMMANDS)
+    if user_tokens.meta.get("commands_hash") == digest:
+        return
     
-    await bot.set_my_commands(commands)
+    await bot.set_my_commands(BOT_COMMANDS)
+    user_tokens.meta["commands_hash"] = digest
+    user_tokens.save()
+    print(f"Bot commands updated in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+async def warm_up_caches():
+    """Load doctors catalog in background once polling runs"""
+    started = time.perf_counter()
+    doctors = await api_client.refresh_catalog()
+    elapsed = (time.perf_counter() - started) * 1000
+    if doctors is None:
+        print(f"Cache warm-up: catalog not loaded after {elapsed:.0f} ms, serving snapshot")
+    else:
+        print(f"Cache warm-up: {len(doctors)} doctors in {elapsed:.0f} ms")
+
+async def on_startup(bot: Bot):
+    """Polling is about to start - report timing, continue setup in background"""
+    startup_timer.mark("dispatcher startup")
+    print(startup_timer.report())
+    
+    for job in (set_bot_commands(bot), warm_up_caches()):
+        task = asyncio.create_task(job)
+        task.add_done_callback(_log_background_error)
+        background_tasks.append(task)
+
+def _log_background_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        print(f"Startup task error: {task.exception()}")
+
+dp.startup.register(on_startup)
+
+def collect_metrics():
+    """Refresh gauges before /metrics scrape"""
+    metrics.observe_caches({**api_client.caches(), "rendered": rendered})
+    metrics.active_sessions.set(len(user_tokens))
+    
+    metrics.fsm_states.clear()
+    states = Counter(
+        record.state for record in dp.storage.storage.values() if record.state
+    )
+    for fsm_state, count in states.items():
+        metrics.fsm_states.set(count, state=fsm_state)
+    
+    for reason, count in throttling.throttled.items():
+        metrics.throttled_updates.set(count, reason=reason)
+
+metrics.registry.collectors.append(collect_metrics)
+
+async def expire_sessions_periodically(bot: Bot):
+    """Warn users before their token expires, drop expired sessions"""
+    while True:
+        await asyncio.sleep(SESSION_CHECK_INTERVAL)
+        
+        for user_id in user_tokens.expiring(SESSION_EXPIRY_WARNING):
+            # Пользователь мог выйти, пока отправлялись предыдущие предупреждения
+            session = user_tokens.get(user_id)
+            if session is None or session.get("warned"):
+                continue
+            session["warned"] = True
+            try:
+                await bot.send_message(
+                    user_id,
+                    "⏳ **Сессия скоро истечет**\n\n"
+                    "Чтобы не потерять доступ к записям, войдите в систему заново.",
+                    reply_markup=BotKeyboards.main_menu(),
+                    parse_mode="Markdown"
+                )
+            except Exception as e:
+                print(f"Expiry warning error: {e}")
+        
+        for user_id in user_tokens.evict_expired():
+            end_session(user_id)
+
+async def poll_waitlist_periodically(bot: Bot):
+    """Notify waiting users about slots freed outside the bot"""
+    while True:
+        await asyncio.sleep(WAITLIST_POLL_INTERVAL)
+        
+        waitlist.drop_before(datetime.now().strftime("%Y-%m-%d"))
+        if not len(waitlist) or not len(user_tokens):
+            continue
+        
+        # Индекс занятого времени общий для всех врачей - хватит любого токена.
+        # Начинаем с последнего входа: у старых сессий токен скорее отозван
+        index = access_token = None
+        for user_id in reversed(list(user_tokens.sessions)):
+            session = user_tokens.get(user_id)
+            if session is None:
+                continue
+            access_token = session["token"]
+            try:
+                index = await api_client.booked_index(access_token)
+            except AuthenticationError:
+                # Отозванный токен без exp сам не истечет - завершаем сессию
+                end_session(user_id)
+                continue
+            except Exception as e:
+                print(f"Waitlist poll error: {e}")
+            break
+        if index is None:
+            continue
+        
+        try:
+            for doctor_id, date in waitlist.keys():
+                booked = index.get((doctor_id, date), ())
+                await notify_waitlist(
+                    bot, doctor_id, date, [t for t in BOOKING_TIMES if t not in booked], access_token
+                )
+        except Exception as e:
+            print(f"Waitlist poll error: {e}")
+
+def save_catalog_snapshot(saved_at=None):
+    """Write catalog to disk if it was fetched after `saved_at`, return fetch time"""
+    snapshot = api_client.catalog_snapshot()
+    if not CATALOG_SNAPSHOT_PATH or snapshot is None or snapshot["fetched_at"] == saved_at:
+        return saved_at
+    try:
+        save_snapshot(CATALOG_SNAPSHOT_PATH, snapshot)
+    except OSError as e:
+        print(f"Catalog snapshot error: {e}")
+        return saved_at
+    return snapshot["fetched_at"]
+
+async def save_catalog_periodically():
+    """Keep on-disk catalog snapshot up to date"""
+    saved_at = api_client.catalog_fetched_at
+    while True:
+        await asyncio.sleep(CATALOG_SNAPSHOT_INTERVAL)
+        saved_at = save_catalog_snapshot(saved_at)
+
+async def save_sessions_periodically():
+    """Flush session store to disk"""
+    while True:
+        await asyncio.sleep(SESSION_SAVE_INTERVAL)
+        # Копию снимаем в цикле событий, а сериализуем и пишем в потоке -
+        # на больших хранилищах запись занимает секунды
+        try:
+            await asyncio.to_thread(user_tokens.write, user_tokens.snapshot())
+        except OSError as e:
+            print(f"Session store save error: {e}")
+
+async def shutdown(bot: Bot):
+    """Drain in-flight work, persist state and close connections"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SHUTDOWN_TIMEOUT
+    
+    # Polling уже остановлен - новые апдейты не приходят, дожидаемся текущих
+    if not await in_flight.wait_idle(SHUTDOWN_TIMEOUT):
+        print(f"Shutdown: {in_flight.active} обработчиков не завершились за {SHUTDOWN_TIMEOUT} с")
+    
+    for task in background_tasks:
+        task.cancel()
+    broadcaster.pause()  # Прогресс сохранен, продолжится после запуска
+    for task in list(prefetch_tasks.values()):
+        task.cancel()
+    
+    # Записи/отмены, начатые обработчиками, доводим до конца
+    if not await api_client.drain(max(0.0, deadline - loop.time())):
+        print("Shutdown: не все запросы к API завершились")
+    
+    # Сессии, статистика и состояния FSM
+    user_tokens.save()
+    save_catalog_snapshot()
+    
+    await api_client.close()
+    await bot.session.close()
+    tracing.tracer.flush()
+    if profiler.stats:
+        profiler.dump()
 
 async def main():
     if not BOT_TOKEN:
         print("BOT_TOKEN не найден в .env файле")
         return
     
+    global bot
+    startup_timer.mark("imports and handlers")
+    bot = Bot(token=BOT_TOKEN)
+    startup_timer.mark("bot")
+    
+    user_tokens.load()
+    startup_timer.mark("sessions load")
+    
+    # Каталог из снимка - просмотр врачей доступен сразу, даже без API
+    snapshot = load_snapshot(CATALOG_SNAPSHOT_PATH)
+    if snapshot:
+        print(f"Catalog snapshot: {api_client.restore_catalog(snapshot)} doctors")
+    startup_timer.mark("catalog snapshot")
+    background_tasks.append(asyncio.create_task(save_catalog_periodically()))
+    background_tasks.append(asyncio.create_task(save_sessions_periodically()))
+    background_tasks.append(asyncio.create_task(expire_sessions_periodically(bot)))
+    background_tasks.append(asyncio.create_task(poll_waitlist_periodically(bot)))
+    
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await metrics.start_metrics_server(METRICS_PORT)
+        startup_timer.mark("metrics server")
+    
     try:
-        # Устанавливаем команды бота
-        await set_bot_commands()
+        await api_client.start()
+        
+        # Продолжаем рассылку, прерванную перезапуском
+        broadcaster.resume(bot)
+        startup_timer.mark("api client")
+        
+        # Команды бота и прогрев кэшей - в фоне из on_startup
         
-        # Запускаем polling
-        await dp.start_polling(bot)
+        # Запускаем polling (до SIGTERM/SIGINT); сессию бота закрываем сами -
+        # обработчикам, которые еще работают, нужно отправить ответы
+        await dp.start_polling(bot, close_bot_session=False)
         
     except Exception as e:
         print(f"Error starting bot: {e}")
     finally:
-        await bot.session.close()
+        await shutdown(bot)
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
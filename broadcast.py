@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import time
+from array import array
+from bisect import bisect_right
+from typing import Dict, Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+import metrics
+from sessions import SessionStore
+
+# Telegram allows about 30 messages per second to different chats
+BROADCAST_RATE = 25
+BATCH_SIZE = 25
+MAX_RETRIES = 3
+
+
+class Broadcaster:
+    """Announcement to every logged in user, resumable after restart
+
+    Recipients are walked in ascending Telegram ID order; the last ID of
+    each finished batch is saved as cursor, so after a crash at most one
+    batch is sent twice. Every user gets a single message, which keeps
+    per-chat limits; the global limit is kept by pacing batches.
+    """
+
+    def __init__(self, sessions: SessionStore, state_path: Optional[str] = None,
+                 rate: float = BROADCAST_RATE, batch_size: int = BATCH_SIZE):
+        self.sessions = sessions
+        self.state_path = state_path
+        self.rate = rate
+        self.batch_size = batch_size
+        self.state: Optional[Dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, bot: Bot, text: str, admin_id: int) -> bool:
+        """Start new broadcast, False if one is already running"""
+        if self.running:
+            return False
+
+        self.state = {
+            "text": text,
+            "admin_id": admin_id,
+            "cursor": None,
+            "total": len(self.sessions),
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "elapsed": 0.0
+        }
+        self._save()
+        self.task = asyncio.create_task(self._run(bot))
+        return True
+
+    def resume(self, bot: Bot) -> bool:
+        """Continue broadcast interrupted by restart"""
+        if self.running or not self.state_path or not os.path.exists(self.state_path):
+            return False
+
+        with open(self.state_path, encoding="utf-8") as f:
+            self.state = json.load(f)
+        self.task = asyncio.create_task(self._run(bot))
+        return True
+
+    def pause(self) -> None:
+        """Stop sending, keep state on disk for resume()"""
+        if self.running:
+            self.task.cancel()
+
+    def cancel(self) -> None:
+        """Stop sending and forget the broadcast"""
+        self.pause()
+        self.state = None
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def status(self) -> str:
+        if self.state is None:
+            return "Рассылок нет"
+        state = self.state
+        done = state["sent"] + state["blocked"] + state["failed"]
+        return f"{'Идет' if self.running else 'Остановлена'}: {done} из ~{state['total']}\n{self._summary()}"
+
+    def _summary(self) -> str:
+        state = self.state
+        throughput = state["sent"] / state["elapsed"] if state["elapsed"] else 0.0
+        return (
+            f"Доставлено: {state['sent']}, заблокировали бота: {state['blocked']}, "
+            f"ошибок: {state['failed']}\n"
+            f"Скорость: {throughput:.1f} сообщений/с"
+        )
+
+    async def _run(self, bot: Bot) -> None:
+        state = self.state
+        # Snapshot of IDs only (8 bytes per user); users logging in later don't get it
+        recipients = array("q", sorted(self.sessions.sessions))
+        start = bisect_right(recipients, state["cursor"]) if state["cursor"] is not None else 0
+        text = f"📢 Объявление\n\n{state['text']}"
+
+        for i in range(start, len(recipients), self.batch_size):
+            batch = recipients[i:i + self.batch_size]
+            started = time.monotonic()
+
+            results = await asyncio.gather(*(
+                self._send(bot, user_id, text) for user_id in batch if user_id in self.sessions
+            ))
+            for result in results:
+                state[result] += 1
+                metrics.broadcast_messages.inc(result=result)
+
+            # Pace batches to stay under the global limit
+            delay = len(batch) / self.rate - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            state["cursor"] = batch[-1]
+            state["elapsed"] += time.monotonic() - started
+            self._save()
+
+        report = f"📢 Рассылка завершена\n{self._summary()}"
+        self.state = None
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        try:
+            await bot.send_message(state["admin_id"], report)
+        except TelegramAPIError as e:
+            print(f"Broadcast report error: {e}")
+
+    async def _send(self, bot: Bot, user_id: int, text: str) -> str:
+        """Deliver one message, return 'sent', 'blocked' or 'failed'"""
+        for _ in range(MAX_RETRIES):
+            try:
+                await bot.send_message(user_id, text)
+                return "sent"
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramAPIError:
+                return "failed"
+        return "failed"
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
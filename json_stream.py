@@ -0,0 +1,90 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+_WHITESPACE = " \t\n\r"
+# What may follow a complete array element
+_DELIMITERS = ",]" + _WHITESPACE
+
+
+class JSONArrayParser:
+    """Incremental parser of a top-level JSON array
+
+    Chunks of bytes go in, complete elements come out. Only the current
+    chunk and one unfinished element are kept in memory. Elements are
+    decoded with the C-accelerated JSONDecoder.raw_decode; an element cut
+    by a chunk boundary fails to decode and is retried when more data
+    arrives.
+    """
+
+    def __init__(self, predicate: Optional[Callable[[Any], bool]] = None):
+        # Elements not matching predicate are dropped right after decoding
+        self.predicate = predicate
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, chunk: bytes) -> List:
+        self._buffer += self._utf8.decode(chunk)
+        return self._parse(final=False)
+
+    def close(self) -> List:
+        self._buffer += self._utf8.decode(b"", final=True)
+        items = self._parse(final=True)
+        if not self._finished:
+            raise ValueError("JSON array is not terminated")
+        return items
+
+    def _parse(self, final: bool) -> List:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        length = len(buffer)
+
+        while pos < length and not self._finished:
+            char = buffer[pos]
+            if char in _WHITESPACE or (char == "," and self._started):
+                pos += 1
+                continue
+            if not self._started:
+                if char != "[":
+                    raise ValueError("Expected JSON array")
+                self._started = True
+                pos += 1
+                continue
+            if char == "]":
+                self._finished = True
+                pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break  # Element continues in the next chunk
+
+            if not final and char not in '{["' and (end >= length or buffer[end] not in _DELIMITERS):
+                # Numbers/literals are complete only once a delimiter follows:
+                # b"[-4." decodes as -4 before "5" arrives in the next chunk
+                break
+
+            if self.predicate is None or self.predicate(item):
+                items.append(item)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        return items
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes],
+                          predicate: Optional[Callable[[Any], bool]] = None) -> AsyncIterator:
+    """Yield elements of JSON array read from async stream of chunks"""
+    parser = JSONArrayParser(predicate)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
@@ -1,6 +1,9 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+# Available times for booking
+BOOKING_TIMES = ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00", "17:00"]
+
 class BotKeyboards:
     """Class for creating inline keyboards for the medical bot"""
     
@@ -152,17 +155,18 @@ class BotKeyboards:
         keyboard = InlineKeyboardBuilder()
         
         for doctor in doctors_list[:8]:  # Show max 8 doctors
-            name = f"{doctor.get('name', 'Неизвестно')} {doctor.get('surname', '')}"
-            specialization = doctor.get('specialization', '')
-            button_text = f"👨⚕️ {name} - {specialization}"
+            button_text = f"👨⚕️ {doctor.full_name} - {doctor.specialization}"
             
             keyboard.row(
                 InlineKeyboardButton(
                     text=button_text[:64],  # Telegram button text limit
-                    callback_data=f"select_doctor_{doctor['id']}"
+                    callback_data=f"select_doctor_{doctor.id}"
                 )
             )
         
+        keyboard.row(
+            InlineKeyboardButton(text="⏱ Ближайшее свободное время", callback_data="find_earliest")
+        )
         keyboard.row(
             InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
         )
@@ -170,18 +174,69 @@ class BotKeyboards:
         return keyboard.as_markup()
     
     @staticmethod
-    def booking_time_slots() -> InlineKeyboardMarkup:
-        """Available time slots for booking"""
+    def earliest_specializations() -> InlineKeyboardMarkup:
+        """Specialization choice for earliest free slot search"""
+        keyboard = InlineKeyboardBuilder()
+        
+        keyboard.row(
+            InlineKeyboardButton(text="❤️ Кардиология", callback_data="earliest_cardiology"),
+            InlineKeyboardButton(text="🧠 Неврология", callback_data="earliest_neurology")
+        )
+        keyboard.row(
+            InlineKeyboardButton(text="👁️ Офтальмология", callback_data="earliest_ophthalmology"),
+            InlineKeyboardButton(text="🦷 Стоматология", callback_data="earliest_dentistry")
+        )
+        keyboard.row(
+            InlineKeyboardButton(text="🩺 Терапия", callback_data="earliest_therapy"),
+            InlineKeyboardButton(text="🔬 Хирургия", callback_data="earliest_surgery")
+        )
+        keyboard.row(
+            InlineKeyboardButton(text="📋 Любой врач", callback_data="earliest_all")
+        )
+        keyboard.row(
+            InlineKeyboardButton(text="🔙 Назад", callback_data="book_appointment"),
+            InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
+        )
+        
+        return keyboard.as_markup()
+    
+    @staticmethod
+    def earliest_slots(slots) -> InlineKeyboardMarkup:
+        """Earliest free slots, one button per (datetime, doctor)"""
         keyboard = InlineKeyboardBuilder()
         
-        # Available times
-        times = ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00", "17:00"]
+        for starts_at, doctor in slots:
+            button_text = f"📅 {starts_at:%d.%m %H:%M} — {doctor.full_name}"
+            keyboard.row(
+                InlineKeyboardButton(
+                    text=button_text[:64],
+                    callback_data=f"slot_{doctor.id}_{starts_at:%Y-%m-%d_%H:%M}"
+                )
+            )
+        
+        keyboard.row(
+            InlineKeyboardButton(text="🔙 Назад", callback_data="find_earliest"),
+            InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
+        )
+        
+        return keyboard.as_markup()
+    
+    @staticmethod
+    def booking_time_slots(booked_times=()) -> InlineKeyboardMarkup:
+        """Available time slots for booking"""
+        keyboard = InlineKeyboardBuilder()
         
         # Create rows of 3 buttons
-        for i in range(0, len(times), 3):
-            row_times = times[i:i+3]
+        for i in range(0, len(BOOKING_TIMES), 3):
+            row_times = BOOKING_TIMES[i:i+3]
             buttons = []
             for time in row_times:
+                if time in booked_times:
+                    # Already booked - tap to wait for it
+                    buttons.append(
+                        InlineKeyboardButton(text=f"🔴 {time}", callback_data=f"waitlist_{time}")
+                    )
+                    continue
                 buttons.append(
                     InlineKeyboardButton(
                         text=f"⏰ {time}",
@@ -190,6 +245,11 @@ class BotKeyboards:
                 )
             keyboard.row(*buttons)
         
+        if set(BOOKING_TIMES) <= set(booked_times):
+            keyboard.row(
+                InlineKeyboardButton(text="🔔 Сообщить, если время освободится", callback_data="waitlist_any")
+            )
+        
         keyboard.row(
             InlineKeyboardButton(text="🔙 Назад", callback_data="select_date"),
             InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
@@ -197,6 +257,20 @@ class BotKeyboards:
         
         return keyboard.as_markup()
     
+    @staticmethod
+    def waitlist_offer(doctor_id, date, time) -> InlineKeyboardMarkup:
+        """Freed slot notification: book it right away"""
+        keyboard = InlineKeyboardBuilder()
+        
+        keyboard.row(
+            InlineKeyboardButton(text=f"📅 Записаться на {time}", callback_data=f"slot_{doctor_id}_{date}_{time}")
+        )
+        keyboard.row(
+            InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
+        )
+        
+        return keyboard.as_markup()
+    
     @staticmethod
     def booking_confirmation(doctor_name, specialization, date, time) -> InlineKeyboardMarkup:
         """Booking confirmation keyboard"""
@@ -213,21 +287,29 @@ class BotKeyboards:
         return keyboard.as_markup()
     
     @staticmethod
-    def appointments_for_cancellation(appointments_list) -> InlineKeyboardMarkup:
-        """Appointments list for cancellation"""
+    def appointments_for_cancellation(appointments_list, selected=()) -> InlineKeyboardMarkup:
+        """Appointments list for cancellation (click toggles selection)"""
         keyboard = InlineKeyboardBuilder()
         
-        for i, appointment in enumerate(appointments_list[:5], 1):  # Show max 5 appointments
-            appointment_id = appointment.get('id', 'N/A')
-            date = appointment.get('datetime', 'Не указана')[:10]  # Get date part
-            time = appointment.get('datetime', 'Не указано')[11:16]  # Get time part
+        for i, appointment in enumerate(appointments_list[:10], 1):  # Show max 10 appointments
+            date = appointment.date or 'Не указана'
+            time = appointment.time or 'Не указано'
+            mark = "☑️" if appointment.id in selected else "⬜"
             
-            button_text = f"❌ {i}. {date} в {time}"
+            button_text = f"{mark} {i}. {date} в {time}"
             
             keyboard.row(
                 InlineKeyboardButton(
                     text=button_text,
-                    callback_data=f"cancel_appointment_{appointment_id}"
+                    callback_data=f"cancel_toggle_{appointment.id}"
+                )
+            )
+        
+        if selected:
+            keyboard.row(
+                InlineKeyboardButton(
+                    text=f"❌ Отменить выбранные ({len(selected)})",
+                    callback_data="cancel_selected"
                 )
             )
         
@@ -238,6 +320,18 @@ class BotKeyboards:
         
         return keyboard.as_markup()
     
+    @staticmethod
+    def bulk_cancel_confirmation() -> InlineKeyboardMarkup:
+        """Confirmation of cancelling selected appointments"""
+        keyboard = InlineKeyboardBuilder()
+        
+        keyboard.row(
+            InlineKeyboardButton(text="✅ Да, отменить", callback_data="cancel_confirm"),
+            InlineKeyboardButton(text="🔙 Назад", callback_data="cancel_appointments")
+        )
+        
+        return keyboard.as_markup()
+    
     @staticmethod
     def calendar(year: int, month: int) -> InlineKeyboardMarkup:
         """Generate calendar for date selection"""
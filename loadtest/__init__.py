@@ -0,0 +1 @@
+"""Offline load testing of the bot against fake Telegram and Medical API servers"""
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import random
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from aiohttp import web
+
+SPECIALIZATIONS = ["Кардиология", "Неврология", "Офтальмология", "Стоматология", "Терапия", "Хирургия"]
+
+
+class FakeMedicalAPI:
+    """In-memory stub of the FastAPI endpoints used by MedicalAPIClient"""
+
+    def __init__(self, users: int = 100, doctors: int = 50, rooms: int = 5,
+                 history: int = 20, latency: float = 0.0, seed: int = 1):
+        rnd = random.Random(seed)
+        self.latency = latency
+        self.requests = Counter()
+        # Tokens answered with 401 (expired session)
+        self.revoked_tokens = set()
+
+        self.users = [
+            {"id": str(uuid.UUID(int=rnd.getrandbits(128))), "email": f"user{i}@example.com"}
+            for i in range(users)
+        ]
+        self.doctors = [
+            {
+                "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+                "name": f"Врач{i}",
+                "surname": f"Фамилия{i}",
+                "specialization": SPECIALIZATIONS[i % len(SPECIALIZATIONS)],
+                "experience_years": rnd.randint(1, 30)
+            }
+            for i in range(doctors)
+        ]
+        self.rooms = [
+            {"id": str(uuid.UUID(int=rnd.getrandbits(128))), "number": str(100 + i)}
+            for i in range(rooms)
+        ]
+
+        # Past visits so statistics have something to aggregate
+        start = datetime(2024, 1, 1, 9)
+        self.appointments = []
+        for user in self.users:
+            for _ in range(history):
+                self.appointments.append({
+                    "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+                    "user_id": user["id"],
+                    "doctor_id": rnd.choice(self.doctors)["id"],
+                    "room_id": rnd.choice(self.rooms)["id"],
+                    "datetime": (start + timedelta(days=rnd.randint(0, 600), hours=rnd.randint(0, 8))).isoformat()
+                })
+
+    def user_appointments(self, email: str):
+        user = next(u for u in self.users if u["email"] == email)
+        return [a for a in self.appointments if a["user_id"] == user["id"]]
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler):
+        route = request.match_info.route.resource
+        name = route.canonical if route else request.path
+        self.requests[f"{request.method} {name}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.headers.get("Authorization", "").removeprefix("Bearer ") in self.revoked_tokens:
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    async def login(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        return web.json_response({"access_token": f"token-{form.get('username')}", "token_type": "bearer"})
+
+    async def list_users(self, request: web.Request) -> web.Response:
+        return web.json_response(self.users)
+
+    async def list_doctors(self, request: web.Request) -> web.Response:
+        return self._catalog_response(request, self.doctors)
+
+    async def get_doctor(self, request: web.Request) -> web.Response:
+        doctor = next((d for d in self.doctors if d["id"] == request.match_info["id"]), None)
+        if doctor is None:
+            raise web.HTTPNotFound()
+        return web.json_response(doctor)
+
+    async def list_rooms(self, request: web.Request) -> web.Response:
+        return self._catalog_response(request, self.rooms)
+
+    def _catalog_response(self, request: web.Request, payload) -> web.Response:
+        """JSON with ETag, 304 on matching If-None-Match, gzip if accepted"""
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.requests[f"{request.method} {request.path} (304)"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        response = web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+        response.enable_compression()
+        return response
+
+    async def list_appointments(self, request: web.Request) -> web.Response:
+        return web.json_response(self.appointments)
+
+    async def create_appointment(self, request: web.Request) -> web.Response:
+        appointment = await request.json()
+        appointment["id"] = str(uuid.uuid4())
+        self.appointments.append(appointment)
+        return web.json_response(appointment, status=201)
+
+    async def delete_appointment(self, request: web.Request) -> web.Response:
+        appointment_id = request.match_info["id"]
+        before = len(self.appointments)
+        self.appointments = [a for a in self.appointments if a["id"] != appointment_id]
+        if len(self.appointments) == before:
+            raise web.HTTPNotFound()
+        return web.Response(status=204)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._count])
+        app.router.add_post("/api/v1/auth/login", self.login)
+        app.router.add_get("/api/v1/users", self.list_users)
+        app.router.add_get("/api/v1/doctors", self.list_doctors)
+        app.router.add_get("/api/v1/doctors/{id}", self.get_doctor)
+        app.router.add_get("/api/v1/rooms", self.list_rooms)
+        app.router.add_get("/api/v1/appointments", self.list_appointments)
+        app.router.add_post("/api/v1/appointments", self.create_appointment)
+        app.router.add_delete("/api/v1/appointments/{id}", self.delete_appointment)
+        return app
@@ -0,0 +1,46 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+from aiohttp import web
+
+
+class FakeTelegramAPI:
+    """Minimal Bot API server: accepts every call and returns plausible results"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self._message_ids = itertools.count(1000)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.requests[method] += 1
+
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            chat_id = int(params.get("chat_id") or 0)
+            result = {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", "")
+            }
+        elif method == "getUpdates":
+            # Long polling with nothing to deliver (lets bot.main() run against this server)
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 1.0))
+            result = []
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "loadtest_bot"}
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
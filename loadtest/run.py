@@ -0,0 +1,289 @@
+"""Replay synthetic user sessions through the real Dispatcher
+
+    python -m loadtest.run --users 200 --scenario full --backend-latency 0.02
+
+The bot talks to a local fake Bot API and a local stub of the Medical API,
+so nothing leaves the machine. Reports throughput, latency percentiles per
+step and scenario, and request counts seen by both fake servers.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from aiohttp import web
+
+# Must be set before bot.py is imported
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+os.environ.setdefault("SESSION_STORE_PATH", "")
+os.environ.setdefault("THROTTLE_RATE", "1000")
+os.environ.setdefault("THROTTLE_BURST", "1000")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TRACE_FILE", "")
+os.environ.setdefault("BROADCAST_STATE_PATH", "")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from loadtest.fake_backend import FakeMedicalAPI  # noqa: E402
+from loadtest.fake_telegram import FakeTelegramAPI  # noqa: E402
+
+_update_ids = itertools.count(1)
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def next_workday() -> date:
+    day = date.today() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+class SyntheticUser:
+    """One Telegram user sending updates through dispatcher"""
+
+    def __init__(self, runner: "LoadTest", index: int):
+        self.runner = runner
+        self.index = index
+        self.telegram_id = 10_000 + index
+        self.email = f"user{index}@example.com"
+        self.chat = {"id": self.telegram_id, "type": "private"}
+        self.sender = {"id": self.telegram_id, "is_bot": False, "first_name": f"User{index}"}
+
+    async def message(self, text: str, step: str = None) -> None:
+        await self._feed(step or text, {
+            "message": {
+                "message_id": next(_update_ids),
+                "date": int(time.time()),
+                "chat": self.chat,
+                "from": self.sender,
+                "text": text
+            }
+        })
+
+    async def click(self, data: str, step: str = None) -> None:
+        await self._feed(step or data, {
+            "callback_query": {
+                "id": str(next(_update_ids)),
+                "from": self.sender,
+                "chat_instance": str(self.telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": self.chat,
+                    "text": "..."
+                }
+            }
+        })
+
+    async def inline(self, query: str, step: str = "inline_query") -> None:
+        await self._feed(step, {
+            "inline_query": {
+                "id": str(next(_update_ids)),
+                "from": self.sender,
+                "query": query,
+                "offset": ""
+            }
+        })
+
+    async def _feed(self, step: str, payload: dict) -> None:
+        update = Update.model_validate(
+            {"update_id": next(_update_ids), **payload},
+            context={"bot": self.runner.bot}
+        )
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(self.runner.bot, update)
+        self.runner.step_latency[step].append(time.perf_counter() - started)
+        self.runner.updates += 1
+        if self.runner.think_time:
+            await asyncio.sleep(self.runner.think_time)
+
+    async def login(self) -> None:
+        await self.message("/start")
+        await self.click("login")
+        await self.message(f"{self.email}:password", "login_credentials")
+
+    async def browse(self) -> None:
+        await self.click("doctors_list")
+        await self.click("view_all_doctors")
+        await self.click("search_doctors")
+        await self.click("search_therapy")
+        await self.click("search_all_doctors")
+
+    async def book_view_cancel(self) -> None:
+        backend = self.runner.backend
+        doctor = backend.doctors[self.index % len(backend.doctors)]
+        day = next_workday().isoformat()
+
+        await self.click("book_appointment")
+        await self.click(f"select_doctor_{doctor['id']}", "select_doctor")
+        await self.click(f"date_{day}", "date")
+        await self.click("select_time_10:00", "select_time")
+        await self.click("confirm_booking")
+        await self.click("my_appointments")
+        await self.click("view_appointments")
+        await self.click("cancel_appointments")
+
+        created = next(
+            (a for a in backend.user_appointments(self.email)
+             if a["doctor_id"] == doctor["id"] and a["datetime"].startswith(day)),
+            None
+        )
+        if created:
+            await self.click(f"cancel_toggle_{created['id']}", "cancel_toggle")
+            await self.click("cancel_selected")
+            await self.click("cancel_confirm")
+
+    async def earliest(self) -> None:
+        await self.click("book_appointment")
+        await self.click("find_earliest")
+        await self.click("earliest_therapy")
+        await self.click("earliest_all")
+
+    async def inline_search(self) -> None:
+        # Typing "@bot Тер..." sends a query per keystroke
+        for query in ("", "Т", "Тер", "Терапия", "Терапия Иван"):
+            await self.inline(query)
+
+    async def statistics(self) -> None:
+        await self.click("my_statistics")
+
+
+SCENARIOS = {
+    "browse": lambda user: [user.message("/start"), user.browse()],
+    "earliest": lambda user: [user.login(), user.earliest()],
+    "inline": lambda user: [user.inline_search()],
+    "statistics": lambda user: [user.login(), user.statistics(), user.statistics(), user.statistics()],
+    "full": lambda user: [user.login(), user.browse(), user.book_view_cancel(), user.statistics()],
+}
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.think_time = args.think_time
+        self.backend = FakeMedicalAPI(
+            users=args.users, doctors=args.doctors, history=args.history, latency=args.backend_latency
+        )
+        self.telegram = FakeTelegramAPI()
+        self.bot = None
+        self.step_latency = defaultdict(list)
+        self.updates = 0
+
+    async def _serve(self, app: web.Application, port: int) -> web.AppRunner:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+    async def run_scenario(self, name: str) -> dict:
+        users = [SyntheticUser(self, i) for i in range(self.args.users)]
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        session_latency = []
+
+        async def run_user(user):
+            async with semaphore:
+                started = time.perf_counter()
+                for step in SCENARIOS[name](user):
+                    await step
+                session_latency.append(time.perf_counter() - started)
+
+        self.step_latency.clear()
+        self.updates = 0
+        self.backend.requests.clear()
+        self.telegram.requests.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+        return {
+            "elapsed": elapsed,
+            "updates": self.updates,
+            "sessions": sorted(session_latency),
+            "steps": {step: sorted(values) for step, values in self.step_latency.items()},
+            "backend": dict(self.backend.requests),
+            "telegram": dict(self.telegram.requests)
+        }
+
+    async def run(self) -> None:
+        backend_runner = await self._serve(self.backend.app(), self.args.backend_port)
+        telegram_runner = await self._serve(self.telegram.app(), self.args.telegram_port)
+
+        self.bot = Bot(
+            token=os.environ["BOT_TOKEN"],
+            session=AiohttpSession(
+                api=TelegramAPIServer.from_base(f"http://127.0.0.1:{self.args.telegram_port}")
+            )
+        )
+        bot_module.api_client.base_url = f"http://127.0.0.1:{self.args.backend_port}"
+        await bot_module.api_client.start()
+
+        try:
+            for name in self.args.scenario:
+                report(name, await self.run_scenario(name))
+                # Next scenario starts from logged out users and cold caches
+                bot_module.user_tokens.sessions.clear()
+                bot_module.user_tokens.statistics.clear()
+                for cache in bot_module.api_client.caches().values():
+                    cache.clear()
+        finally:
+            await bot_module.api_client.close()
+            await self.bot.session.close()
+            await telegram_runner.cleanup()
+            await backend_runner.cleanup()
+
+
+def _latency_row(name: str, values) -> str:
+    return (f"  {name:<28} {len(values):>7} "
+            f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+            f"{percentile(values, 99) * 1000:>9.1f}")
+
+
+def report(name: str, result: dict) -> None:
+    print(f"\n=== Scenario: {name} ===")
+    print(f"  sessions: {len(result['sessions'])}, updates: {result['updates']}, "
+          f"time: {result['elapsed']:.2f}s, throughput: {result['updates'] / result['elapsed']:.1f} updates/s")
+    print(f"  {'step':<28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print(_latency_row("session", result["sessions"]))
+    for step, values in result["steps"].items():
+        print(_latency_row(step, values))
+
+    print("  backend requests:")
+    for endpoint, count in sorted(result["backend"].items()):
+        print(f"    {endpoint:<40} {count:>7}")
+    print("  telegram requests:")
+    for method, count in sorted(result["telegram"].items()):
+        print(f"    {method:<40} {count:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the medical bot")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["full"])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--history", type=int, default=20, help="past appointments per user")
+    parser.add_argument("--backend-latency", type=float, default=0.0, help="seconds added to each backend request")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between user actions")
+    parser.add_argument("--backend-port", type=int, default=18000)
+    parser.add_argument("--telegram-port", type=int, default=18001)
+    args = parser.parse_args()
+
+    asyncio.run(LoadTest(args).run())
+
+
+if __name__ == "__main__":
+    main()
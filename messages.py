@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List
+from cache import TTLCache
+from models import Appointment, Doctor
+
+DOCTORS_PER_PAGE = 10
+APPOINTMENTS_PER_PAGE = 5
+
+# Keys carry data version, so entries never go stale - TTL only frees memory
+RENDER_TTL = 3600
+rendered = TTLCache(RENDER_TTL, maxsize=4096)
+
+
+def render_cached(key: Hashable, render: Callable[[], str]) -> str:
+    """Rendered text for key, calling render() only on a miss"""
+    text = rendered.get(key)
+    if text is None:
+        text = render()
+        rendered.set(key, text)
+    return text
+
+
+class BotMessages:
+    """Class for formatting message texts of the medical bot"""
+
+    @staticmethod
+    def statistics(stats: Dict) -> str:
+        """User statistics message"""
+        total = stats.get('total_appointments', 0)
+        if total == 0:
+            return "📊 **Моя статистика**\n\n📋 У вас пока нет записей к врачам.\n\nЗапишитесь на прием чтобы увидеть статистику!"
+
+        stats_text = f"📊 **Моя статистика**\n\n"
+
+        # Total appointments
+        stats_text += f"📋 **Общее количество посещений:** {total}\n\n"
+
+        # Favorite doctors
+        favorite_doctors = stats.get('favorite_doctors', [])
+        if favorite_doctors:
+            stats_text += "👨⚕️ **Любимые врачи:**\n"
+            for i, doctor in enumerate(favorite_doctors, 1):
+                stats_text += f"{i}. {doctor['name']} - {doctor['visits']} посещений\n"
+            stats_text += "\n"
+
+        # Specializations
+        specializations = stats.get('specializations', {})
+        if specializations:
+            stats_text += "🏥 **По специализациям:**\n"
+            for spec, count in list(specializations.items())[:3]:
+                stats_text += f"• {spec}: {count} посещений\n"
+            stats_text += "\n"
+
+        # Monthly activity
+        monthly_visits = stats.get('monthly_visits', {})
+        if monthly_visits:
+            stats_text += "📅 **Последние месяцы:**\n"
+            sorted_months = sorted(monthly_visits.items(), reverse=True)[:3]
+            for month, count in sorted_months:
+                try:
+                    month_name = datetime.strptime(month, '%Y-%m').strftime('%B %Y')
+                    stats_text += f"• {month_name}: {count} посещений\n"
+                except ValueError:
+                    stats_text += f"• {month}: {count} посещений\n"
+
+        return stats_text
+
+    @staticmethod
+    def doctors_list(doctors: List[Doctor], title: str, show_experience: bool = False, page: int = 0) -> str:
+        """Page of doctors list (10 per page)"""
+        start = page * DOCTORS_PER_PAGE
+        parts = [f"👨⚕️ **{title}:**\n\n"]
+
+        for i, doctor in enumerate(doctors[start:start + DOCTORS_PER_PAGE], start + 1):
+            parts.append(f"**{i}. {doctor.full_name}**\n🏥 Специализация: {doctor.specialization or 'Не указано'}\n")
+            if show_experience:
+                experience = doctor.experience_years if doctor.experience_years is not None else 'Не указано'
+                parts.append(f"📅 Опыт: {experience} лет\n")
+            parts.append("\n")
+
+        remaining = len(doctors) - start - DOCTORS_PER_PAGE
+        if remaining > 0:
+            parts.append(f"... и еще {remaining} врачей\n\n")
+
+        parts.append("Для записи к врачу используйте главное меню.")
+
+        return "".join(parts)
+
+    @staticmethod
+    def doctor_card(doctor: Doctor) -> str:
+        """Single doctor (inline mode result)"""
+        experience = doctor.experience_years if doctor.experience_years is not None else 'Не указано'
+        return (
+            f"👨⚕️ **{doctor.full_name}**\n"
+            f"🏥 Специализация: {doctor.specialization or 'Не указано'}\n"
+            f"📅 Опыт: {experience} лет"
+        )
+
+    @staticmethod
+    def appointments_list(appointments: List[Appointment], page: int = 0) -> str:
+        """Page of user's appointments (5 per page)"""
+        start = page * APPOINTMENTS_PER_PAGE
+        parts = ["📋 **Ваши записи:**\n\n"]
+
+        for i, appointment in enumerate(appointments[start:start + APPOINTMENTS_PER_PAGE], start + 1):
+            when = appointment.starts_at.strftime('%d.%m.%Y %H:%M') if appointment.starts_at else 'Не указана'
+            parts.append(f"**{i}.** Запись #{appointment.id}\n📅 Дата: {when}\n\n")
+
+        return "".join(parts)
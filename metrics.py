@@ -0,0 +1,239 @@
+import re
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Tuple
+import aiohttp
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Metric:
+    """Base class of metrics in Prometheus text exposition format"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Tuple, float] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> Tuple:
+        return tuple(sorted(labels.items()))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Set value of counter kept elsewhere (updated at scrape time)"""
+        self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = labels + (("le", repr(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series[-1]}')
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Set of metrics plus callbacks refreshing them before each scrape"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.add(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.add(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_duration = registry.histogram(
+    "bot_handler_duration_seconds", "Time spent in update handlers"
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Handlers finished with exception"
+)
+api_request_duration = registry.histogram(
+    "bot_api_request_duration_seconds", "Medical API request latency"
+)
+api_requests = registry.counter(
+    "bot_api_requests_total", "Medical API requests by endpoint and status"
+)
+cache_hits = registry.counter("bot_cache_hits_total", "Cache hits")
+cache_misses = registry.counter("bot_cache_misses_total", "Cache misses")
+cache_entries = registry.gauge("bot_cache_entries", "Entries stored in cache")
+fsm_states = registry.gauge("bot_fsm_states", "Users in each FSM state")
+active_sessions = registry.gauge("bot_active_sessions", "Logged in users")
+throttled_updates = registry.counter("bot_throttled_updates_total", "Updates dropped by throttling")
+broadcast_messages = registry.counter("bot_broadcast_messages_total", "Broadcast messages by result")
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Measure handler latency"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, handler=name)
+
+
+_ID_SEGMENT = re.compile(r"/(doctors|appointments|users|rooms)/[^/]+")
+
+
+def endpoint_label(method: str, path: str) -> str:
+    """'GET /api/v1/doctors/42' -> 'GET /api/v1/doctors/{id}'"""
+    path = _ID_SEGMENT.sub(r"/\1/{id}", path)
+    return f"{method} {path}"
+
+
+def client_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks recording Medical API latency and status codes"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.metrics_started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        _observe_request(context, params.method, params.url.path, str(params.response.status))
+
+    async def on_request_exception(session, context, params):
+        _observe_request(context, params.method, params.url.path, "error")
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+def _observe_request(context, method: str, path: str, status: str) -> None:
+    endpoint = endpoint_label(method, path)
+    api_request_duration.observe(time.perf_counter() - context.metrics_started, endpoint=endpoint)
+    api_requests.inc(endpoint=endpoint, status=status)
+
+
+def observe_caches(caches: Dict[str, Any]) -> None:
+    """Export hit/miss counters of TTLCache objects"""
+    for name, cache in caches.items():
+        cache_hits.set(cache.hits, cache=name)
+        cache_misses.set(cache.misses, cache=name)
+        cache_entries.set(len(cache), cache=name)
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> "web.AppRunner":
+    """Serve registry at http://host:port/metrics"""
+    # aiohttp.web is only needed when the endpoint is enabled - keeps startup import light
+    from aiohttp import web
+
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject
+from cache import TTLCache
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens per second, up to `capacity` stored"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FairScheduler:
+    """Global limit of heavy requests; free slots are handed out in arrival order
+
+    Each user has at most one waiter (see ThrottlingMiddleware), so FIFO
+    order is round-robin across users.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was already handed to us - pass it on
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # Slot goes straight to the next waiting user
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Per-user rate limit and at most one heavy request per user in flight
+
+    Handlers are marked heavy with `flags={"heavy": True}`.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 10, heavy_limit: int = 20):
+        self.rate = rate
+        self.burst = burst
+        # Idle users' buckets are full anyway, so they can expire
+        self.buckets = TTLCache(ttl=max(burst / rate, 60))
+        self.scheduler = FairScheduler(heavy_limit)
+        self.busy_users = set()
+        # Dropped updates by reason: "rate" / "busy"
+        self.throttled = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        bucket = self.buckets.get(user.id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+        self.buckets.set(user.id, bucket)
+
+        if not bucket.consume():
+            self.throttled["rate"] += 1
+            await self._notify(event, "⏳ Слишком много запросов, подождите немного")
+            return None
+
+        if not get_flag(data, "heavy"):
+            return await handler(event, data)
+
+        if user.id in self.busy_users:
+            self.throttled["busy"] += 1
+            await self._notify(event, "⏳ Предыдущий запрос еще выполняется")
+            return None
+
+        self.busy_users.add(user.id)
+        try:
+            await self.scheduler.acquire()
+            try:
+                return await handler(event, data)
+            finally:
+                self.scheduler.release()
+        finally:
+            self.busy_users.discard(user.id)
+
+    @staticmethod
+    async def _notify(event: TelegramObject, text: str) -> None:
+        # Only callbacks get a toast; answering messages would cost more sends
+        if isinstance(event, CallbackQuery):
+            await event.answer(text)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Count updates being processed so shutdown can wait for them"""
+
+    def __init__(self):
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.active += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no update is processed, False on timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse ISO datetime from API ('Z' suffix allowed), None if invalid"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+class _DictAccess:
+    """dict-style read access (record['name'], record.get('name'))"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
+@dataclass(slots=True)
+class Doctor(_DictAccess):
+    id: str
+    name: str
+    surname: str
+    specialization: str
+    experience_years: Optional[int] = None
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.name} {self.surname}".strip()
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Doctor":
+        return cls(
+            data['id'],
+            data.get('name', 'Неизвестно'),
+            data.get('surname', ''),
+            data.get('specialization', ''),
+            data.get('experience_years')
+        )
+
+
+@dataclass(slots=True)
+class Appointment(_DictAccess):
+    id: str
+    user_id: str
+    doctor_id: str
+    room_id: Optional[str]
+    # Parsed once when the record is created, None if API sent garbage
+    starts_at: Optional[datetime]
+
+    @property
+    def date(self) -> str:
+        """'YYYY-MM-DD' or '' if unknown"""
+        return self.starts_at.strftime('%Y-%m-%d') if self.starts_at else ''
+
+    @property
+    def time(self) -> str:
+        """'HH:MM' or '' if unknown"""
+        return self.starts_at.strftime('%H:%M') if self.starts_at else ''
+
+    @property
+    def month(self) -> Optional[str]:
+        """'YYYY-MM' key for statistics"""
+        return self.starts_at.strftime('%Y-%m') if self.starts_at else None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Appointment":
+        return cls(
+            data['id'],
+            data.get('user_id'),
+            data.get('doctor_id'),
+            data.get('room_id'),
+            parse_datetime(data.get('datetime'))
+        )
+
+
+@dataclass(slots=True)
+class Room(_DictAccess):
+    id: str
+    number: str
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Room":
+        return cls(data['id'], data.get('number', 'Неизвестно'))
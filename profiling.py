@@ -0,0 +1,119 @@
+import cProfile
+import os
+import pstats
+import random
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+# cProfile sees the whole thread: while a handler awaits, other coroutines
+# run on the loop and get recorded into its profile too
+PROFILE_CAVEAT = (
+    "Note: each profile also contains coroutines interleaved on the event loop "
+    "while the handler was awaiting; per-handler attribution is approximate."
+)
+
+
+class HandlerProfiler:
+    """Sampled cProfile of handlers plus tracemalloc allocation sites"""
+
+    def __init__(self, output_dir: str = "profiles", sample_rate: float = 0.1):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.enabled = False
+        # handler name -> accumulated pstats.Stats
+        self.stats: Dict[str, pstats.Stats] = {}
+        self.samples: Dict[str, int] = {}
+        # A profile is running (shared by all middleware instances)
+        self.active = False
+
+    def enable(self) -> None:
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def disable(self) -> None:
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def add(self, name: str, profile: cProfile.Profile) -> None:
+        if name in self.stats:
+            self.stats[name].add(profile)
+        else:
+            self.stats[name] = pstats.Stats(profile)
+        self.samples[name] = self.samples.get(name, 0) + 1
+
+    def dump(self, top: int = 25) -> List[str]:
+        """Write per-handler profiles and top allocation sites, return file paths"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = []
+
+        for name, stats in self.stats.items():
+            path = os.path.join(self.output_dir, f"{name}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+
+        if self.stats:
+            path = os.path.join(self.output_dir, "summary.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"{PROFILE_CAVEAT}\n\n{self.summary()}\n")
+            paths.append(path)
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            path = os.path.join(self.output_dir, "allocations.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+            paths.append(path)
+
+        return paths
+
+    def summary(self) -> str:
+        """Handlers sorted by sampled cumulative time"""
+        lines = []
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total_tt):
+            samples = self.samples[name]
+            lines.append(f"{name}: {samples} выборок, {stats.total_tt / samples * 1000:.1f} мс в среднем")
+        return "\n".join(lines)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Profile sampled handler executions
+
+    Only one execution is profiled at a time across all instances sharing
+    the profiler: cProfile covers the whole thread, and Python allows a
+    single active profiler.
+    """
+
+    def __init__(self, profiler: HandlerProfiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if (not self.profiler.enabled or self.profiler.active
+                or random.random() >= self.profiler.sample_rate):
+            return await handler(event, data)
+
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+
+        self.profiler.active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await handler(event, data)
+        finally:
+            profile.disable()
+            self.profiler.active = False
+            self.profiler.add(name, profile)
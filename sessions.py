@@ -0,0 +1,153 @@
+import base64
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+from user_stats import UserStatistics
+from waitlist import Waitlist
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """exp claim of JWT (unix time), None if token has no readable exp
+
+    Signature is not checked - backend does that, we only need to know
+    when to ask the user to log in again.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class SessionStore:
+    """User sessions (token + email) persisted to a JSON file"""
+
+    def __init__(self, path: Optional[str] = None, fsm_storage: Optional[MemoryStorage] = None,
+                 waitlist: Optional[Waitlist] = None):
+        self.path = path
+        self.sessions: Dict[int, Dict] = {}
+        # Statistics aggregates by user email
+        self.statistics: Dict[str, UserStatistics] = {}
+        # In-memory FSM states/data saved along with sessions (survive restarts)
+        self.fsm_storage = fsm_storage
+        # Users waiting for freed slots
+        self.waitlist = waitlist
+        # Small bot-level values remembered between starts
+        self.meta: Dict = {}
+        # Periodic flush in a worker thread may overlap the shutdown one
+        self._write_lock = threading.Lock()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.sessions
+
+    def __getitem__(self, user_id: int) -> Dict:
+        return self.sessions[user_id]
+
+    def __setitem__(self, user_id: int, session: Dict) -> None:
+        self.sessions[user_id] = session
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def get(self, user_id: int, default=None):
+        return self.sessions.get(user_id, default)
+
+    def pop(self, user_id: int, default=None):
+        return self.sessions.pop(user_id, default)
+
+    def items(self):
+        return self.sessions.items()
+
+    def login(self, user_id: int, token: str, email: str) -> Dict:
+        """Start session for user, remembering when the token expires"""
+        session = {"token": token, "email": email, "expires_at": token_expiry(token)}
+        # Re-login moves the user to the end: sessions stay in login order
+        self.sessions.pop(user_id, None)
+        self.sessions[user_id] = session
+        return session
+
+    def expiring(self, within: float, now: Optional[float] = None) -> List[int]:
+        """Users whose token expires in less than `within` seconds"""
+        deadline = (now or time.time()) + within
+        return [
+            user_id for user_id, session in self.sessions.items()
+            if session.get("expires_at") and session["expires_at"] <= deadline
+        ]
+
+    def evict_expired(self, now: Optional[float] = None) -> List[int]:
+        """Drop sessions with expired tokens, return their user ids"""
+        expired = self.expiring(0, now)
+        for user_id in expired:
+            del self.sessions[user_id]
+        return expired
+
+    def load(self) -> None:
+        """Read sessions from disk (missing file means empty store)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        # Update in place: the API client holds a reference to statistics
+        self.sessions.clear()
+        self.sessions.update(
+            (int(user_id), session)
+            for user_id, session in data.get("sessions", {}).items()
+        )
+        self.statistics.clear()
+        self.statistics.update(
+            (email, UserStatistics.load(stats))
+            for email, stats in data.get("statistics", {}).items()
+        )
+
+        self.meta.clear()
+        self.meta.update(data.get("meta", {}))
+
+        if self.fsm_storage is not None:
+            for bot_id, chat_id, user_id, thread_id, destiny, state, fsm_data in data.get("fsm", []):
+                key = StorageKey(bot_id, chat_id, user_id, thread_id, destiny)
+                self.fsm_storage.storage[key] = MemoryStorageRecord(fsm_data, state)
+
+        if self.waitlist is not None:
+            self.waitlist.load(data.get("waitlist", []))
+
+    def snapshot(self) -> Dict:
+        """Copy of the persisted state, safe to serialize outside the event loop"""
+        data = {
+            "sessions": {str(user_id): dict(s) for user_id, s in self.sessions.items()},
+            "statistics": {email: s.dump() for email, s in self.statistics.items()},
+            "meta": dict(self.meta)
+        }
+        if self.fsm_storage is not None:
+            data["fsm"] = [
+                [key.bot_id, key.chat_id, key.user_id, key.thread_id, key.destiny, record.state, dict(record.data)]
+                for key, record in self.fsm_storage.storage.items()
+                if record.state or record.data
+            ]
+        if self.waitlist is not None:
+            data["waitlist"] = self.waitlist.dump()
+        return data
+
+    def write(self, data: Dict) -> None:
+        """Write snapshot to disk atomically, readable by the owner only (it holds tokens)"""
+        if not self.path:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with self._write_lock:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def save(self) -> None:
+        """Write sessions to disk atomically"""
+        if self.path:
+            self.write(self.snapshot())
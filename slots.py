@@ -0,0 +1,46 @@
+import heapq
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from models import Doctor
+
+# How far ahead the earliest free slot is searched
+SEARCH_DAYS = 14
+
+BookedIndex = Dict[Tuple[str, str], Set[str]]
+
+
+def workdays(start: date, days: int) -> List[date]:
+    """Mon-Fri dates among `days` days from `start` (clinic is closed on weekends)"""
+    return [day for day in (start + timedelta(days=i) for i in range(days)) if day.weekday() < 5]
+
+
+def free_slots(doctor: Doctor, booked: BookedIndex, days: List[date],
+               times: List[Tuple[str, datetime]], now: datetime) -> Iterator[Tuple[datetime, Doctor]]:
+    """Free slots of one doctor in chronological order"""
+    for day in days:
+        taken = booked.get((doctor.id, day.isoformat()), ())
+        for label, start in times:
+            if label in taken:
+                continue
+            starts_at = datetime.combine(day, start.time())
+            if starts_at > now:
+                yield starts_at, doctor
+
+
+def earliest_free_slots(doctors: Iterable[Doctor], booked: BookedIndex, times: List[str],
+                        limit: int = 5, days: int = SEARCH_DAYS,
+                        now: Optional[datetime] = None) -> List[Tuple[datetime, Doctor]]:
+    """First `limit` free slots across doctors, earliest first
+
+    Each doctor's slots are generated lazily in order and merged through
+    a heap, so only about `limit` slots per doctor are ever looked at.
+    """
+    now = now or datetime.now()
+    search_days = workdays(now.date(), days)
+    parsed_times = sorted((label, datetime.strptime(label, "%H:%M")) for label in times)
+    merged = heapq.merge(
+        *(free_slots(doctor, booked, search_days, parsed_times, now) for doctor in doctors),
+        key=lambda slot: slot[0]
+    )
+    return list(islice(merged, limit))
@@ -0,0 +1,35 @@
+import json
+import os
+import time
+import zlib
+from typing import Dict, Optional
+
+# Bumped when the layout changes; older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path: str, data: Dict) -> int:
+    """Write zlib-compressed JSON atomically, return its size in bytes"""
+    payload = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), **data}
+    body = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode())
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return len(body)
+
+
+def load_snapshot(path: str) -> Optional[Dict]:
+    """Read snapshot, None if it's missing, damaged or of another version"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = json.loads(zlib.decompress(f.read()))
+    except (OSError, zlib.error, ValueError) as e:
+        print(f"Snapshot {path} ignored: {e}")
+        return None
+    if data.get("version") != SNAPSHOT_VERSION:
+        return None
+    return data
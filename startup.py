@@ -0,0 +1,31 @@
+import hashlib
+import json
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupTimer:
+    """Durations of consecutive startup phases"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self._last = self.started
+
+    def mark(self, name: str) -> None:
+        """Close phase `name` that ran since the previous mark"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        lines = [f"Startup: {(self._last - self.started) * 1000:.0f} ms"]
+        for name, duration in self.phases:
+            lines.append(f"  {name:<24} {duration * 1000:>8.1f} ms")
+        return "\n".join(lines)
+
+
+def commands_hash(commands) -> str:
+    """Stable hash of bot command list (BotCommand objects)"""
+    payload = json.dumps([command.model_dump() for command in commands], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
@@ -0,0 +1,123 @@
+"""Appointment caches stay coherent on booking and cancellation
+
+Runs MedicalAPIClient against the load-test stub of the Medical API.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+import api_client
+from api_client import MedicalAPIClient
+from loadtest.fake_backend import FakeMedicalAPI
+
+EMAIL = "user0@example.com"
+TOKEN = f"token-{EMAIL}"
+
+
+class SlowListAPI(FakeMedicalAPI):
+    """Answers /appointments with data taken before a delay"""
+
+    async def list_appointments(self, request: web.Request) -> web.Response:
+        response = web.json_response(list(self.appointments))
+        await asyncio.sleep(0.2)
+        return response
+
+
+@asynccontextmanager
+async def running(backend: FakeMedicalAPI, **client_options):
+    runner = web.AppRunner(backend.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    client = MedicalAPIClient(f"http://127.0.0.1:{port}", **client_options)
+    await client.start()
+    try:
+        yield client
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def list_requests(backend: FakeMedicalAPI) -> int:
+    return backend.requests["GET /api/v1/appointments"]
+
+
+def test_booking_visible_in_cached_list_without_refetch():
+    async def scenario():
+        backend = FakeMedicalAPI(users=3, doctors=5, history=3)
+        async with running(backend) as client:
+            before = await client.get_user_appointments(EMAIL, TOKEN)
+            created = await client.create_appointment(
+                backend.doctors[0]["id"], "2030-01-02", "10:00", EMAIL, TOKEN
+            )
+            after = await client.get_user_appointments(EMAIL, TOKEN)
+
+            assert created["id"] in {appointment.id for appointment in after}
+            assert len(after) == len(before) + 1
+            assert list_requests(backend) == 1
+
+    asyncio.run(scenario())
+
+
+def test_read_started_before_booking_does_not_overwrite_cache():
+    async def scenario():
+        backend = SlowListAPI(users=3, doctors=5, history=3)
+        async with running(backend) as client:
+            # List snapshot is taken before the booking, response arrives after it
+            read = asyncio.create_task(client.get_user_appointments(EMAIL, TOKEN))
+            await asyncio.sleep(0.1)
+            created = await client.create_appointment(
+                backend.doctors[0]["id"], "2030-01-02", "10:00", EMAIL, TOKEN
+            )
+            stale = await read
+
+            assert created["id"] not in {appointment.id for appointment in stale}
+            current = await client.get_user_appointments(EMAIL, TOKEN)
+            assert created["id"] in {appointment.id for appointment in current}
+
+    asyncio.run(scenario())
+
+
+def test_cancellation_updates_list_slots_and_statistics():
+    async def scenario():
+        backend = FakeMedicalAPI(users=3, doctors=5, history=3)
+        async with running(backend) as client:
+            doctor_id = backend.doctors[0]["id"]
+            created = await client.create_appointment(doctor_id, "2030-01-02", "10:00", EMAIL, TOKEN)
+            await client.get_user_appointments(EMAIL, TOKEN)
+            stats = await client.get_user_statistics(EMAIL, TOKEN)
+            assert "10:00" in await client.get_booked_slots(doctor_id, "2030-01-02", TOKEN)
+            requests = list_requests(backend)
+
+            assert await client.cancel_appointment(created["id"], TOKEN, EMAIL)
+
+            remaining = await client.get_user_appointments(EMAIL, TOKEN)
+            assert created["id"] not in {appointment.id for appointment in remaining}
+            assert "10:00" not in await client.get_booked_slots(doctor_id, "2030-01-02", TOKEN)
+            after = await client.get_user_statistics(EMAIL, TOKEN)
+            assert after["total_appointments"] == stats["total_appointments"] - 1
+            assert created["id"] not in client.user_statistics[EMAIL].appointments
+            # Everything above was answered from caches
+            assert list_requests(backend) == requests
+
+    asyncio.run(scenario())
+
+
+def test_streamed_list_matches_buffered(monkeypatch):
+    # Small chunks cut appointments at many places
+    monkeypatch.setattr(api_client, "STREAM_CHUNK_SIZE", 7)
+
+    async def scenario():
+        backend = FakeMedicalAPI(users=3, doctors=5, history=5)
+        async with running(backend) as client:
+            buffered = await client.get_user_appointments(EMAIL, TOKEN)
+        async with running(backend, stream_appointments=True) as client:
+            streamed = await client.get_user_appointments(EMAIL, TOKEN)
+
+        assert streamed
+        assert streamed == buffered
+
+    asyncio.run(scenario())
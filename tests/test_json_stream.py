@@ -0,0 +1,89 @@
+"""Streamed JSON array parsing gives the same elements wherever chunks are cut"""
+import asyncio
+import json
+
+import pytest
+
+from json_stream import JSONArrayParser, iter_json_array
+
+BODIES = [
+    "[]",
+    " \n[ ] \t",
+    "[-4.5, 1e3, 0, -0.25E-2, 12345678901234567890]",
+    "[true, false, null, 7]",
+    '["a,]b", "quote \\" and ]", "\\\\", "\\u0416\\n", ""]',
+    '[{"doctor": "Иванов", "note": "кабинет №5 🩺"}, ["ä", "€"], "日本"]',
+    '\r\n [ {"id": 1, "tags": [1, 2, {"x": null}]} ,\n\t{"id": 2} ] \n',
+]
+
+
+def parse_in_chunks(body: bytes, cuts, predicate=None):
+    parser = JSONArrayParser(predicate)
+    items = []
+    start = 0
+    for cut in [*cuts, len(body)]:
+        items += parser.feed(body[start:cut])
+        start = cut
+    return items + parser.close()
+
+
+@pytest.mark.parametrize("text", BODIES)
+def test_every_split_offset_matches_json_loads(text):
+    body = text.encode("utf-8")
+    expected = json.loads(text)
+
+    for offset in range(len(body) + 1):
+        assert parse_in_chunks(body, [offset]) == expected, offset
+
+
+@pytest.mark.parametrize("text", BODIES)
+def test_byte_by_byte_matches_json_loads(text):
+    body = text.encode("utf-8")
+
+    assert parse_in_chunks(body, range(1, len(body))) == json.loads(text)
+
+
+def test_scalar_is_held_until_delimiter():
+    parser = JSONArrayParser()
+
+    assert parser.feed(b"[-4.") == []
+    assert parser.feed(b"5, 1e") == [-4.5]
+    assert parser.feed(b"3, tr") == [1000.0]
+    assert parser.feed(b"ue") == []
+    assert parser.feed(b"]") == [True]
+    assert parser.close() == []
+
+
+@pytest.mark.parametrize("body", [b"[1, 2", b"[-4.", b"{}", b'["a"'])
+def test_malformed_or_unterminated_array_fails(body):
+    parser = JSONArrayParser()
+    with pytest.raises(ValueError):
+        parser.feed(body)
+        parser.close()
+
+
+def test_predicate_filters_elements_at_every_offset():
+    rows = [
+        {"id": i, "user_id": i % 3, "note": "перенос, ]" if i % 2 else "ok"}
+        for i in range(12)
+    ]
+    body = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+    predicate = lambda apt: apt.get("user_id") == 1
+    expected = [row for row in rows if predicate(row)]
+
+    for offset in range(len(body) + 1):
+        assert parse_in_chunks(body, [offset], predicate) == expected, offset
+
+
+def test_iter_json_array_with_predicate():
+    body = json.dumps([{"user_id": 1, "id": "a"}, {"user_id": 2, "id": "b"}, {"user_id": 1, "id": "c"}])
+
+    async def chunks():
+        data = body.encode("utf-8")
+        for i in range(0, len(data), 5):
+            yield data[i:i + 5]
+
+    async def collect():
+        return [apt async for apt in iter_json_array(chunks(), lambda apt: apt["user_id"] == 1)]
+
+    assert [apt["id"] for apt in asyncio.run(collect())] == ["a", "c"]
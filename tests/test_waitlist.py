@@ -0,0 +1,48 @@
+"""Freed slots go to waiting users first come first served, one user per slot"""
+from waitlist import Waitlist
+
+DOCTOR = "doctor-1"
+DATE = "2030-01-02"
+
+
+def waitlist_of(*subscriptions) -> Waitlist:
+    waitlist = Waitlist()
+    for user_id, time in subscriptions:
+        waitlist.subscribe(user_id, DOCTOR, DATE, time)
+    return waitlist
+
+
+def test_slot_goes_to_first_waiter_only():
+    waitlist = waitlist_of((1, None), (2, None), (3, "10:00"))
+
+    assert waitlist.take(DOCTOR, DATE, ["10:00"]) == [(1, "10:00")]
+    # The rest keep their places for the next freed slot
+    assert waitlist.dump() == [[DOCTOR, DATE, 2, None], [DOCTOR, DATE, 3, "10:00"]]
+    assert waitlist.take(DOCTOR, DATE, ["10:00"]) == [(2, "10:00")]
+
+
+def test_each_free_time_offered_once():
+    waitlist = waitlist_of((1, None), (2, "09:00"), (3, "09:00"), (4, None), (5, None))
+
+    offers = waitlist.take(DOCTOR, DATE, ["11:00", "09:00", "09:00"])
+
+    # Any-time waiters get the earliest time left, duplicates count once
+    assert offers == [(1, "09:00"), (4, "11:00")]
+    assert [user_id for _, _, user_id, _ in waitlist.dump()] == [2, 3, 5]
+
+
+def test_waiter_for_other_time_keeps_place():
+    waitlist = waitlist_of((1, "12:00"), (2, "10:00"))
+
+    assert waitlist.take(DOCTOR, DATE, ["10:00"]) == [(2, "10:00")]
+    assert waitlist.take(DOCTOR, DATE, ["12:00", "15:00"]) == [(1, "12:00")]
+    assert len(waitlist) == 0
+    assert (DOCTOR, DATE) not in waitlist
+
+
+def test_nothing_free_or_nobody_waiting():
+    waitlist = waitlist_of((1, None))
+
+    assert waitlist.take(DOCTOR, DATE, []) == []
+    assert waitlist.take("doctor-2", DATE, ["10:00"]) == []
+    assert len(waitlist) == 1
@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+import aiohttp
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Timed operation; children share trace_id of the root span"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id",
+                 "start", "duration", "attributes")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.time() - self.start
+            self.tracer.export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    """Collects spans into a JSON-lines file (disabled without path)"""
+
+    def __init__(self, path: Optional[str] = None, buffer_size: int = 100):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Run block inside a child span of the current one"""
+        if not self.enabled:
+            yield None
+            return
+
+        span = Span(self, name, current_span.get(), attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def export(self, span: Span) -> None:
+        self._buffer.append(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer or not self.path:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+
+
+tracer = Tracer(os.getenv("TRACE_FILE") or None)
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Root span per Telegram update (register as dp.update outer middleware)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        attributes = {}
+        if isinstance(event, Update):
+            attributes["update_id"] = event.update_id
+            attributes["update_type"] = event.event_type
+        user = data.get("event_from_user")
+        if user:
+            attributes["user_id"] = user.id
+
+        with tracer.span("update", **attributes):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Child span per handler call"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+
+        with tracer.span(f"handler {name}"):
+            return await handler(event, data)
+
+
+def client_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks creating a span per Medical API request
+
+    The trace id goes to the backend in X-Request-ID / traceparent headers,
+    so backend logs can be matched with bot traces.
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        parent = current_span.get()
+        context.span = None
+        if not tracer.enabled:
+            return
+
+        span = Span(tracer, f"api {params.method} {params.url.path}", parent, {})
+        context.span = span
+        params.headers["X-Request-ID"] = span.trace_id
+        params.headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-01"
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_started = time.time()
+
+    async def on_connection_create_end(session, context, params):
+        if context.span:
+            context.span.attributes["connect_ms"] = round((time.time() - context.connect_started) * 1000, 3)
+
+    async def on_request_headers_sent(session, context, params):
+        if context.span:
+            # From here until response headers it's network + backend time
+            context.span.attributes["sent_ms"] = round((time.time() - context.span.start) * 1000, 3)
+
+    async def on_request_end(session, context, params):
+        if context.span:
+            context.span.attributes["status"] = params.response.status
+            context.span.end()
+
+    async def on_request_exception(session, context, params):
+        if context.span:
+            context.span.attributes["error"] = repr(params.exception)
+            context.span.end()
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_headers_sent.append(on_request_headers_sent)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
@@ -0,0 +1,75 @@
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+class UserStatistics:
+    """Per-user statistics aggregate updated on every booking/cancellation"""
+
+    def __init__(self):
+        self.doctor_visits = Counter()
+        self.specialization_visits = Counter()
+        self.monthly_visits = Counter()
+        # appointment_id -> [doctor_name, specialization, month]
+        self.appointments: Dict[str, list] = {}
+        self.reconciled_at = 0.0
+
+    def add(self, appointment_id: str, doctor_name: Optional[str],
+            specialization: Optional[str], month: Optional[str]) -> None:
+        """Account new appointment"""
+        appointment_id = str(appointment_id)
+        if appointment_id in self.appointments:
+            return
+
+        self.appointments[appointment_id] = [doctor_name, specialization, month]
+        if doctor_name:
+            self.doctor_visits[doctor_name] += 1
+        if specialization:
+            self.specialization_visits[specialization] += 1
+        if month:
+            self.monthly_visits[month] += 1
+
+    def remove(self, appointment_id: str) -> None:
+        """Forget cancelled appointment"""
+        entry = self.appointments.pop(str(appointment_id), None)
+        if entry is None:
+            return
+
+        for counter, key in zip(
+            (self.doctor_visits, self.specialization_visits, self.monthly_visits),
+            entry
+        ):
+            if key:
+                counter[key] -= 1
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def is_stale(self, max_age: float) -> bool:
+        return time.time() - self.reconciled_at > max_age
+
+    def to_dict(self) -> Dict:
+        """Statistics in the format shown by the bot"""
+        return {
+            "total_appointments": len(self.appointments),
+            "favorite_doctors": [
+                {"name": doctor, "visits": count}
+                for doctor, count in self.doctor_visits.most_common(3)
+            ],
+            "specializations": dict(self.specialization_visits.most_common()),
+            "monthly_visits": dict(self.monthly_visits)
+        }
+
+    def dump(self) -> Dict:
+        """Serializable state for the session store"""
+        return {
+            "appointments": dict(self.appointments),
+            "reconciled_at": self.reconciled_at
+        }
+
+    @classmethod
+    def load(cls, data: Dict) -> "UserStatistics":
+        stats = cls()
+        for appointment_id, entry in data.get("appointments", {}).items():
+            stats.add(appointment_id, *entry)
+        stats.reconciled_at = data.get("reconciled_at", 0.0)
+        return stats
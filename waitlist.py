@@ -0,0 +1,89 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[str, str]
+
+
+class Waitlist:
+    """Users waiting for a freed slot of a doctor on a date, first come first served
+
+    Subscriptions are indexed by (doctor_id, 'YYYY-MM-DD'); each bucket is an
+    insertion-ordered dict user_id -> wanted time ('HH:MM', None for any), so
+    a freed slot only looks at users of that doctor and day, in FIFO order.
+    """
+
+    def __init__(self):
+        self._index: Dict[Key, Dict[int, Optional[str]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._index.values())
+
+    def keys(self) -> List[Key]:
+        """(doctor_id, date) pairs somebody waits for"""
+        return list(self._index)
+
+    def subscribe(self, user_id: int, doctor_id: str, date: str, time: Optional[str] = None) -> bool:
+        """Add user to the queue of doctor/date, False if already waiting there
+
+        Changing the wanted time keeps the user's place in the queue.
+        """
+        bucket = self._index.setdefault((doctor_id, date), {})
+        if bucket.get(user_id, False) == time:
+            return False
+        bucket[user_id] = time
+        return True
+
+    def unsubscribe(self, user_id: int, doctor_id: str, date: str) -> bool:
+        bucket = self._index.get((doctor_id, date))
+        if not bucket or user_id not in bucket:
+            return False
+        del bucket[user_id]
+        if not bucket:
+            del self._index[(doctor_id, date)]
+        return True
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._index
+
+    def take(self, doctor_id: str, date: str, free_times: Iterable[str]) -> List[Tuple[int, str]]:
+        """Give each free time to the first user in queue it suits, return (user_id, time)
+
+        Users waiting for any time get the earliest free one left. Users
+        without a matching time keep their place.
+        """
+        bucket = self._index.get((doctor_id, date))
+        free = sorted(set(free_times))
+        if not bucket or not free:
+            return []
+
+        matched = []
+        for user_id, time in bucket.items():
+            if not free:
+                break
+            if time is None:
+                matched.append((user_id, free.pop(0)))
+            elif time in free:
+                free.remove(time)
+                matched.append((user_id, time))
+        for user_id, _ in matched:
+            del bucket[user_id]
+        if not bucket:
+            del self._index[(doctor_id, date)]
+        return matched
+
+    def drop_before(self, date: str) -> int:
+        """Forget subscriptions for days before `date`, return how many"""
+        past = [key for key in self._index if key[1] < date]
+        return sum(len(self._index.pop(key)) for key in past)
+
+    def dump(self) -> List[List]:
+        """[doctor_id, date, user_id, time] rows in queue order"""
+        return [
+            [doctor_id, date, user_id, time]
+            for (doctor_id, date), bucket in self._index.items()
+            for user_id, time in bucket.items()
+        ]
+
+    def load(self, rows: List[List]) -> None:
+        self._index.clear()
+        for doctor_id, date, user_id, time in rows:
+            self._index.setdefault((doctor_id, date), {})[user_id] = time